@@ -0,0 +1,249 @@
+# batch.py
+# Headless batch processing: OCR (and optionally translate) every PDF below a
+# directory without a display. Files are processed concurrently by a bounded
+# pool, each output is written atomically, and files whose outputs already
+# exist are skipped, so an interrupted run can simply be started again.
+#
+# Usage: python -m ocr_tool batch <dir> [--output DIR] [--target-lang DE] ...
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from boilerplate import RepeatedLines
+from checkpoints import JobCheckpoint
+from exporters import EXPORT_FORMATS, create_exporter
+from metrics import metrics
+from ocr_engine import create_worker_pool, engine_from_settings, get_page_count
+from settings import load_settings, read_api_key
+from text_processing import normalize_page
+from translation import TranslationEngine, TranslationMemory
+
+SUMMARY_FILE_NAME = "batch_summary.json"
+
+
+def find_pdfs(input_dir):
+    pdf_paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                pdf_paths.append(os.path.join(root, name))
+    return sorted(pdf_paths)
+
+# Output files mirror the input tree below output_dir
+def get_output_paths(pdf_path, input_dir, output_dir, target_lang=None, export_format='txt'):
+    relative_path = os.path.relpath(pdf_path, input_dir)
+    base_path = os.path.join(output_dir, os.path.splitext(relative_path)[0])
+    paths = {'text': f"{base_path}.{export_format}"}
+    if target_lang:
+        paths['translation'] = f"{base_path}.{target_lang}.{export_format}"
+    return paths
+
+def write_text_file(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+def process_file(pdf_path, output_paths, ocr_engine, translation_engine=None, target_lang=None,
+                 strip_repeated_lines=True):
+    started = time.perf_counter()
+    page_count = get_page_count(pdf_path)
+    # A file interrupted mid-way continues from its last recognized page
+    checkpoint = JobCheckpoint.for_document(pdf_path, ocr_engine.checkpoint_params())
+    pages = []
+    # Pages are written as they are recognized; the file appears once complete
+    with create_exporter(output_paths['text']) as exporter:
+        for page_index, text in enumerate(ocr_engine.iter_pdf(pdf_path, page_count, checkpoint)):
+            pages.append(normalize_page(text))
+            exporter.add_page(pages[-1], source=ocr_engine.page_sources[page_index],
+                              passes=ocr_engine.page_passes[page_index],
+                              confidence=ocr_engine.page_confidences[page_index])
+    checkpoint.complete()
+
+    if translation_engine is not None:
+        with create_exporter(output_paths['translation']) as exporter:
+            repeated_lines = RepeatedLines() if strip_repeated_lines else None
+            for text in translation_engine.translate_pages(pages, target_lang, repeated_lines):
+                exporter.add_page(text, lang=target_lang)
+
+    return {
+        'status': 'done',
+        'pages': page_count,
+        'characters': sum(len(text) for text in pages),
+        'sources': ocr_engine.source_counts(),
+        'quality': ocr_engine.quality_report(),
+        'seconds': round(time.perf_counter() - started, 3),
+        'outputs': output_paths,
+    }
+
+
+class BatchRunner:
+    def __init__(self, input_dir, output_dir=None, target_lang=None, jobs=2, ocr_workers=0,
+                 api_key=None, settings=None, export_format='txt'):
+        self.settings = settings or load_settings()
+        self.input_dir = input_dir
+        self.output_dir = output_dir or os.path.join(input_dir, "ocr_output")
+        self.target_lang = target_lang
+        self.export_format = export_format
+        self.jobs = max(1, jobs)
+        # Split the cores between the files processed at the same time
+        if not ocr_workers:
+            ocr_workers = max(1, (os.cpu_count() or 1) // self.jobs)
+        self.ocr_workers = ocr_workers
+        # One pool of OCR processes for the whole run, created in run(): the
+        # workers (and a tesserocr model loaded in each) serve every file
+        # instead of being started again for each one
+        self.ocr_pool = None
+        # Every file gets its own engine (the page sources and confidences
+        # are per document); their timings are added up in this one
+        self.ocr_engine = engine_from_settings(self.settings, ocr_workers)
+        self.translation_engine = None
+        if target_lang:
+            # Checked here rather than by DeepL, so a run without a key fails
+            # before any file is OCR'd instead of after every one of them
+            api_key = api_key or read_api_key()
+            if not api_key:
+                raise ValueError("translation needs a DeepL API key: pass --api-key or save one in the application")
+            self.translation_engine = TranslationEngine(
+                api_key, TranslationMemory(), self.settings['deepl_server_url'],
+                self.settings['translation_concurrency'])
+        self.summary_path = os.path.join(self.output_dir, SUMMARY_FILE_NAME)
+        self.summary = self.load_summary()
+        self._lock = threading.Lock()
+
+    def load_summary(self):
+        try:
+            with open(self.summary_path, 'r', encoding='utf-8') as file:
+                summary = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            summary = {}
+        summary.setdefault('files', {})
+        summary['input_dir'] = os.path.abspath(self.input_dir)
+        return summary
+
+    def save_summary(self):
+        files = self.summary['files'].values()
+        self.summary['totals'] = {
+            status: sum(1 for entry in files if entry['status'] == status)
+            for status in ('done', 'skipped', 'failed')
+        }
+        self.summary['totals']['pages'] = sum(entry.get('pages', 0) for entry in files if entry['status'] == 'done')
+        # Rasterization, preprocessing and OCR cost of the pages recognized in
+        # this run, and the pixel savings of the DPI and crop settings
+        self.summary['stage_ms_per_page'] = self.ocr_engine.timing_report()
+        self.summary['resolution'] = self.ocr_engine.resolution_report()
+        write_text_file(self.summary_path, json.dumps(self.summary, indent=2))
+        if self.settings['metrics_file']:
+            metrics.export(self.settings['metrics_file'])
+
+    def record(self, relative_path, entry):
+        # Rewritten after every file so the summary survives an interruption
+        with self._lock:
+            self.summary['files'][relative_path] = entry
+            self.save_summary()
+
+    def run_file(self, pdf_path):
+        relative_path = os.path.relpath(pdf_path, self.input_dir)
+        output_paths = get_output_paths(pdf_path, self.input_dir, self.output_dir, self.target_lang,
+                                        self.export_format)
+        previous = self.summary['files'].get(relative_path)
+        if all(os.path.exists(path) for path in output_paths.values()):
+            if previous is None or previous['status'] != 'done':
+                self.record(relative_path, {'status': 'skipped', 'outputs': output_paths})
+            return relative_path, 'skipped'
+        ocr_engine = engine_from_settings(self.settings, self.ocr_workers, self.ocr_pool)
+        try:
+            entry = process_file(pdf_path, output_paths, ocr_engine, self.translation_engine, self.target_lang,
+                                 self.settings['strip_repeated_lines'])
+        except Exception as e:
+            entry = {'status': 'failed', 'error': str(e)}
+        with self._lock:
+            self.ocr_engine.add_stats(ocr_engine)
+        self.record(relative_path, entry)
+        return relative_path, entry['status']
+
+    def run(self, progress=None):
+        pdf_paths = find_pdfs(self.input_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+        # A single worker runs in this process, as an engine without a pool does
+        if self.jobs * self.ocr_workers > 1:
+            self.ocr_pool = create_worker_pool(self.jobs * self.ocr_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                futures = [pool.submit(self.run_file, pdf_path) for pdf_path in pdf_paths]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    relative_path, status = future.result()
+                    if progress:
+                        progress(done, len(pdf_paths), relative_path, status)
+        finally:
+            if self.ocr_pool is not None:
+                self.ocr_pool.shutdown(cancel_futures=True)
+                self.ocr_pool = None
+        with self._lock:
+            self.save_summary()
+        return self.summary
+
+
+def run_batch(input_dir, output_dir=None, target_lang=None, jobs=2, ocr_workers=0, api_key=None,
+              export_format='txt'):
+    return BatchRunner(input_dir, output_dir, target_lang, jobs, ocr_workers, api_key,
+                       export_format=export_format).run()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ocr_tool batch",
+                                     description="OCR (and optionally translate) every PDF in a directory.")
+    parser.add_argument("input_dir")
+    parser.add_argument("-o", "--output", help="output directory (default: <input_dir>/ocr_output)")
+    parser.add_argument("-t", "--target-lang", help="DeepL target language code, e.g. DE; omit to skip translation")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="files processed at the same time")
+    parser.add_argument("-w", "--ocr-workers", type=int, default=0,
+                        help="OCR processes per file (default: cores divided by jobs)")
+    parser.add_argument("-f", "--format", choices=EXPORT_FORMATS, default="txt",
+                        help="output format: txt (pages separated by form feeds), jsonl (one JSON object "
+                             "per page) or docx (one section per page)")
+    parser.add_argument("--dpi", help="rasterization DPI, or 'auto' to pick it from the text size of each file")
+    parser.add_argument("--crop", help="only OCR this region, as left,top,right,bottom page fractions, "
+                                       "e.g. 0,0.08,1,0.92 to skip headers and footers")
+    parser.add_argument("--block-ocr", action="store_true",
+                        help="split large pages (plans, long receipts) into text blocks recognized in parallel")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="re-read pages with low OCR confidence at a higher DPI with stronger preprocessing")
+    parser.add_argument("--metrics", help="write metrics to this file after every PDF "
+                                          "(.prom: Prometheus text format, otherwise JSON)")
+    parser.add_argument("--api-key", help="DeepL API key (default: the key saved by the GUI)")
+    args = parser.parse_args(argv)
+
+    settings = load_settings()
+    if args.dpi:
+        settings['dpi'] = args.dpi if args.dpi == 'auto' else int(args.dpi)
+    if args.crop:
+        settings['crop_region'] = [float(value) for value in args.crop.split(',')]
+    if args.block_ocr:
+        settings['block_ocr'] = True
+    if args.adaptive:
+        settings['adaptive_ocr'] = True
+    if args.metrics:
+        settings['metrics_file'] = args.metrics
+
+    def report(done, total, relative_path, status):
+        print(f"[{done}/{total}] {status:7} {relative_path}", flush=True)
+
+    try:
+        runner = BatchRunner(args.input_dir, args.output, args.target_lang, args.jobs, args.ocr_workers,
+                             args.api_key, settings, args.format)
+    except ValueError as error:
+        parser.error(str(error))
+    summary = runner.run(report)
+    totals = summary['totals']
+    print(f"done: {totals['done']}, skipped: {totals['skipped']}, failed: {totals['failed']}, "
+          f"summary: {runner.summary_path}")
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+# benchmark.py
+# Performance benchmarks for the OCR tool.
+#
+#   python benchmark.py backends [--pages 20]
+#   python benchmark.py dpi [--pages 5] [--crop 0,0.08,1,0.92]
+#   python benchmark.py pipeline [--pages 2,10] [--dpis 150,200,300] [--baseline FILE]
+#   python benchmark.py duplicates [--dpis 150,200,300]
+#
+# "backends" measures the per-page cost of every available OCR backend on
+# synthetic pages: a tiny blank image isolates the fixed per-call overhead
+# (process start, temp file, model load), a rendered text page shows the
+# total per-page time.
+#
+# "dpi" measures preprocessing + OCR time per page at several resolutions
+# (and optionally with a crop region) against full pages at DEFAULT_DPI.
+#
+# "pipeline" runs the whole OCR -> clean -> translate -> export pipeline on
+# synthetic image-only PDFs of known text, one case per page count and
+# rasterization DPI. Each case runs in a fresh process so its peak RSS is its
+# own. Translation goes to a local DeepL stub. Per case it records the time
+# per stage, pages/sec, peak RSS and character accuracy against the rendered
+# text, and compares them with a stored baseline; regressions beyond the
+# tolerance are listed and make the exit status 1.
+#
+# "duplicates" is a regression check of the duplicate page detection: pages
+# that differ in one digit of a date or one letter of a name must be
+# recognized on their own, a second noisy scan of a page must be reused.
+# Any wrong decision makes the exit status 1.
+
+import os
+import sys
+import json
+import time
+import random
+import difflib
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import cv2
+from PIL import Image
+from ocr_backends import create_backend, tesserocr_available
+from ocr_engine import DEFAULT_DPI, OCREngine, crop_page, ocr_page
+from page_classifier import DUPLICATE, PageClassifier
+from text_processing import normalize_page
+from translation import TranslationEngine, TranslationMemory
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+# Synthetic PDFs are rendered at this resolution, like a good scan
+SOURCE_DPI = 300
+# (case, first line of the first page, of the second page, duplicate expected)
+DUPLICATE_CASES = [
+    ("date differs by one digit", "Datum: 12.03.2024", "Datum: 13.03.2024", False),
+    ("date differs by one digit (2)", "Datum: 01.01.2024", "Datum: 07.01.2024", False),
+    ("name differs by one letter", "Patient: Muster Hans", "Patient: Muster Hanz", False),
+    ("same page scanned again", "Datum: 12.03.2024", "Datum: 12.03.2024", True),
+]
+WORDS = ("patient report result normal blood pressure heart rate medication daily dose tablet "
+         "morning evening clinic doctor follow visit history allergy none known weight height "
+         "temperature therapy week month year left right chest pain mild severe stable").split()
+
+
+# White grayscale page with `lines` lines of known text
+def synthetic_page(width=1700, height=2200, lines=30, text="The quick brown fox jumps over the lazy dog 0123456789"):
+    return render_lines([text] * lines, width, height)
+
+def render_lines(texts, width, height, lines=None):
+    page = np.full((height, width), 255, dtype=np.uint8)
+    line_height = height // ((lines or len(texts)) + 2)
+    for line, text in enumerate(texts):
+        cv2.putText(page, text, (60, line_height * (line + 1)), cv2.FONT_HERSHEY_SIMPLEX,
+                    line_height / 45, 0, 2, cv2.LINE_AA)
+    return page
+
+# Writes an image-only PDF of `page_count` letter pages of random sentences;
+# returns the text of every page. The same seed gives the same document.
+def write_synthetic_pdf(path, page_count, lines_per_page=40, seed=0):
+    rng = random.Random(seed)
+    width, height = int(8.5 * SOURCE_DPI), int(11 * SOURCE_DPI)
+    images, page_texts = [], []
+    for _ in range(page_count):
+        texts = [' '.join(rng.choice(WORDS) for _ in range(7)) + f" {rng.randrange(1000)}"
+                 for _ in range(lines_per_page)]
+        images.append(Image.fromarray(render_lines(texts, width, height)))
+        page_texts.append('\n'.join(texts))
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:], resolution=SOURCE_DPI)
+    return page_texts
+
+# Character-level similarity of the recognized text to the ground truth,
+# ignoring how whitespace was laid out
+def text_accuracy(recognized, expected):
+    return difflib.SequenceMatcher(None, ' '.join(recognized.split()), ' '.join(expected.split()),
+                                   autojunk=False).ratio()
+
+# Peak resident set size in MB of this process and of its finished child
+# processes (poppler, tesseract), or None where unsupported
+def peak_rss_mb():
+    if resource is None:
+        return None, None
+    unit = 1 if sys.platform == "darwin" else 1024  # bytes on macOS, KiB elsewhere
+    return tuple(round(resource.getrusage(who).ru_maxrss * unit / 1024 / 1024, 1)
+                 for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+
+# Minimal stand-in for the DeepL /v2/translate endpoint: "translates" by
+# upper-casing, after an optional delay per request to mimic the network
+class DeepLStub:
+    def __init__(self, latency=0.0):
+        latency_seconds = latency
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if 'json' in self.headers.get('Content-Type', ''):
+                    texts = json.loads(body)['text']
+                else:
+                    texts = urllib.parse.parse_qs(body.decode('utf-8'))['text']
+                time.sleep(latency_seconds)
+                response = json.dumps({'translations': [
+                    {'detected_source_language': 'EN', 'text': text.upper(), 'billed_characters': len(text)}
+                    for text in texts]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Runs in a fresh process: the whole pipeline on one synthetic PDF
+def run_pipeline_case(pdf_path, page_texts, dpi, workers, server_url, work_dir):
+    from ocr_tool import save_to_doc
+    page_count = len(page_texts)
+    timings = {}
+    started = time.perf_counter()
+
+    engine = OCREngine(workers, dpi=dpi)
+    texts = engine.recognize_pdf(pdf_path)
+
+    stage_started = time.perf_counter()
+    cleaned = [normalize_page(text) for text in texts]
+    timings['normalize'] = time.perf_counter() - stage_started
+
+    stage_started = time.perf_counter()
+    memory = TranslationMemory(os.path.join(work_dir, f"memory_{os.getpid()}.db"))
+    TranslationEngine("benchmark", memory, server_url).translate_pages(cleaned, "DE")
+    timings['translate'] = time.perf_counter() - stage_started
+
+    stage_started = time.perf_counter()
+    save_to_doc('\n'.join(cleaned), os.path.join(work_dir, f"export_{os.getpid()}.docx"))
+    timings['save_to_doc'] = time.perf_counter() - stage_started
+
+    seconds = time.perf_counter() - started
+    stage_ms = engine.timing_report()
+    stage_ms.update({stage: round(value * 1000 / page_count, 2) for stage, value in timings.items()})
+    peak_rss, peak_child_rss = peak_rss_mb()
+    return {
+        'pages': page_count,
+        'dpi': dpi,
+        'seconds': round(seconds, 3),
+        'pages_per_second': round(page_count / seconds, 3),
+        'stage_ms_per_page': stage_ms,
+        'peak_rss_mb': peak_rss,
+        'peak_child_rss_mb': peak_child_rss,
+        'accuracy': round(text_accuracy('\n'.join(cleaned), '\n'.join(page_texts)), 4),
+    }
+
+def bench_pipeline(page_counts=(2, 10), dpis=(150, 200, 300), workers=1, latency=0.05):
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as work_dir, DeepLStub(latency) as stub:
+        for page_count in page_counts:
+            pdf_path = os.path.join(work_dir, f"synthetic_{page_count}.pdf")
+            page_texts = write_synthetic_pdf(pdf_path, page_count, seed=page_count)
+            for dpi in dpis:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    results[f"{page_count}p_{dpi}dpi"] = pool.submit(
+                        run_pipeline_case, pdf_path, page_texts, dpi, workers, stub.url, work_dir).result()
+    return results
+
+# Lists the cases that got slower, bigger or less accurate than the baseline.
+# Throughput and memory may move by `tolerance` (a fraction), accuracy by
+# one percentage point.
+def find_regressions(results, baseline, tolerance=0.1):
+    regressions = []
+    for case, result in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        if result['pages_per_second'] < previous['pages_per_second'] * (1 - tolerance):
+            regressions.append(f"{case}: pages/sec {previous['pages_per_second']} -> {result['pages_per_second']}")
+        if result['peak_rss_mb'] and previous.get('peak_rss_mb') and \
+                result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{case}: peak RSS {previous['peak_rss_mb']} MB -> {result['peak_rss_mb']} MB")
+        if result['accuracy'] < previous['accuracy'] - 0.01:
+            regressions.append(f"{case}: accuracy {previous['accuracy']} -> {result['accuracy']}")
+    return regressions
+
+def print_pipeline_table(results):
+    print(f"{'case':14} {'pages/s':>8} {'peak RSS MB':>12} {'accuracy':>9}  slowest stages (ms/page)")
+    for case, result in results.items():
+        stages = sorted(result['stage_ms_per_page'].items(), key=lambda item: -item[1])[:3]
+        print(f"{case:14} {result['pages_per_second']:>8} {str(result['peak_rss_mb']):>12} {result['accuracy']:>9}  "
+              + ", ".join(f"{stage} {ms}" for stage, ms in stages))
+
+def time_pages(backend, image, pages):
+    started = time.perf_counter()
+    for _ in range(pages):
+        backend.image_to_string(image)
+    return (time.perf_counter() - started) / pages
+
+def bench_backends(pages=20):
+    backend_names = ['pytesseract'] + (['tesserocr'] if tesserocr_available() else [])
+    blank = np.full((32, 32), 255, dtype=np.uint8)
+    text_page = synthetic_page()
+    results = {}
+    for name in backend_names:
+        started = time.perf_counter()
+        backend = create_backend(name)
+        setup_seconds = time.perf_counter() - started
+        # Warm-up call, so one-off library initialisation is not counted per page
+        backend.image_to_string(blank)
+        results[name] = {
+            'setup_seconds': round(setup_seconds, 4),
+            'overhead_per_page_seconds': round(time_pages(backend, blank, pages), 4),
+            'text_page_seconds': round(time_pages(backend, text_page, max(1, pages // 4)), 4),
+        }
+    return results
+
+# The synthetic page stands for a letter page at DEFAULT_DPI; other
+# resolutions are produced by resampling it
+def bench_resolution(pages=5, dpis=(150, 200, 300), crop_region=None):
+    page = synthetic_page()
+    results = {}
+    baseline = None
+    # The full page at DEFAULT_DPI comes first; it is the baseline
+    for dpi in [DEFAULT_DPI] + sorted(set(dpis) - {DEFAULT_DPI}):
+        scale = dpi / DEFAULT_DPI
+        image = Image.fromarray(cv2.resize(page, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+        variants = [(str(dpi), image)]
+        if crop_region is not None:
+            variants.append((f"{dpi} cropped", crop_page(image, crop_region)))
+        for label, variant in variants:
+            ocr_page(np.asarray(variant))  # warm-up: backend and buffers
+            started = time.perf_counter()
+            for _ in range(pages):
+                ocr_page(np.asarray(variant))
+            seconds = (time.perf_counter() - started) / pages
+            if baseline is None:
+                baseline = seconds
+            results[label] = {
+                'megapixels': round(variant.width * variant.height / 1e6, 2),
+                'seconds_per_page': round(seconds, 4),
+                'speedup': round(baseline / seconds, 2),
+            }
+    return results
+
+# Classifies the second page of every DUPLICATE_CASES pair after the first one
+def check_duplicates(dpis=(150, 200, 300)):
+    body = ["Bericht ueber die ambulante Konsultation vom Montag",
+            "Der Patient berichtet ueber anhaltende Beschwerden"] * 10
+    rng = np.random.default_rng(0)
+    results = {}
+    for dpi in dpis:
+        width, height = int(8.5 * dpi), int(11 * dpi)
+        for case, first_line, second_line, expected in DUPLICATE_CASES:
+            first = render_lines([first_line] + body, width, height, lines=40)
+            second = render_lines([second_line] + body, width, height, lines=40)
+            if expected:
+                # Scanned again: shifted by a pixel, with sensor noise
+                second = np.roll(second, 1, axis=(0, 1)).astype(np.int16) + rng.normal(0, 12, second.shape)
+                second = np.clip(second, 0, 255).astype(np.uint8)
+            classifier = PageClassifier(render_page=lambda page_index, first=first: first)
+            classifier.classify(0, first)
+            skipped = classifier.classify(1, second)
+            results[f"{dpi}dpi {case}"] = {
+                'expected_duplicate': expected,
+                'found_duplicate': skipped is not None and skipped.reason == DUPLICATE,
+            }
+    return results
+
+def print_duplicates_table(results):
+    print(f"{'case':40} {'expected':>9} {'found':>6}")
+    for case, result in results.items():
+        mark = "" if result['expected_duplicate'] == result['found_duplicate'] else "  WRONG"
+        print(f"{case:40} {str(result['expected_duplicate']):>9} {str(result['found_duplicate']):>6}{mark}")
+
+def print_resolution_table(results):
+    print(f"{'dpi':14} {'megapixels':>10} {'s/page':>8} {'speedup':>8}")
+    for label, result in results.items():
+        print(f"{label:14} {result['megapixels']:>10} {result['seconds_per_page']:>8} {result['speedup']:>8}")
+
+def print_table(results):
+    print(f"{'backend':12} {'setup s':>10} {'overhead/page s':>16} {'text page s':>12}")
+    for name, result in results.items():
+        print(f"{name:12} {result['setup_seconds']:>10} {result['overhead_per_page_seconds']:>16} "
+              f"{result['text_page_seconds']:>12}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR tool benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backends_parser = subparsers.add_parser("backends", help="per-page overhead of the OCR backends")
+    backends_parser.add_argument("--pages", type=int, default=20)
+    backends_parser.add_argument("--json", help="also write the results to this file")
+    dpi_parser = subparsers.add_parser("dpi", help="OCR time per page at several resolutions")
+    dpi_parser.add_argument("--pages", type=int, default=5)
+    dpi_parser.add_argument("--dpis", default="150,200,300", help="comma-separated DPI values")
+    dpi_parser.add_argument("--crop", help="also time this crop region (left,top,right,bottom fractions)")
+    dpi_parser.add_argument("--json", help="also write the results to this file")
+    duplicates_parser = subparsers.add_parser("duplicates", help="check the duplicate page detection")
+    duplicates_parser.add_argument("--dpis", default="150,200,300", help="comma-separated DPI values")
+    duplicates_parser.add_argument("--json", help="also write the results to this file")
+    pipeline_parser = subparsers.add_parser("pipeline", help="end-to-end pipeline on synthetic PDFs")
+    pipeline_parser.add_argument("--pages", default="2,10", help="comma-separated page counts")
+    pipeline_parser.add_argument("--dpis", default="150,200,300", help="comma-separated rasterization DPIs")
+    pipeline_parser.add_argument("--workers", type=int, default=1, help="OCR processes (1 times stages in-process)")
+    pipeline_parser.add_argument("--stub-latency-ms", type=float, default=50, help="delay per DeepL stub request")
+    pipeline_parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="baseline to compare against")
+    pipeline_parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    pipeline_parser.add_argument("--tolerance", type=float, default=0.1,
+                                 help="allowed throughput/memory change before flagging a regression")
+    pipeline_parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    status = 0
+    if args.command == "backends":
+        results = bench_backends(args.pages)
+        print_table(results)
+    elif args.command == "dpi":
+        crop_region = [float(value) for value in args.crop.split(',')] if args.crop else None
+        results = bench_resolution(args.pages, [int(dpi) for dpi in args.dpis.split(',')], crop_region)
+        print_resolution_table(results)
+    elif args.command == "duplicates":
+        results = check_duplicates([int(dpi) for dpi in args.dpis.split(',')])
+        print_duplicates_table(results)
+        status = 0 if all(result['expected_duplicate'] == result['found_duplicate']
+                          for result in results.values()) else 1
+    else:
+        cases = bench_pipeline([int(pages) for pages in args.pages.split(',')],
+                               [int(dpi) for dpi in args.dpis.split(',')], args.workers,
+                               args.stub_latency_ms / 1000)
+        print_pipeline_table(cases)
+        # Timings depend on the machine, so the baseline is not part of the
+        # repository; without one nothing was compared and the check fails
+        has_baseline = os.path.exists(args.baseline)
+        baseline = {}
+        if has_baseline:
+            with open(args.baseline, 'r') as file:
+                baseline = json.load(file)['cases']
+        elif not args.update_baseline:
+            print(f"NO BASELINE at {args.baseline}: run with --update-baseline first")
+        regressions = find_regressions(cases, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        results = {'cases': cases, 'regressions': regressions}
+        if args.update_baseline:
+            with open(args.baseline, 'w') as file:
+                json.dump({'cases': cases}, file, indent=2)
+        status = 1 if regressions or not (has_baseline or args.update_baseline) else 0
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# boilerplate.py
+# Letterheads, footers and page-number lines that repeat on every page of a
+# document. They are taken out of the text sent for translation, so they are
+# neither billed once per page nor mixed into the first and last paragraph of
+# every page; each distinct line is translated once and the translation is
+# put back in place on every page.
+#
+# A line counts as repeated when it is among the first or last ZONE_LINES
+# non-empty lines of at least MIN_PAGES pages, compared with whitespace
+# collapsed and digits masked (so "Page 3 of 12" matches "Page 4 of 12").
+# Only the unbroken runs of repeated lines at the very top and bottom of a
+# page are taken out; the body is left alone.
+
+import re
+import collections
+from text_processing import restore_whitespace
+
+ZONE_LINES = 4
+MIN_PAGES = 3
+
+DIGITS = re.compile(r'\d+')
+LETTERS = re.compile(r'[^\W\d_]')
+TOP = 'top'
+BOTTOM = 'bottom'
+
+
+def line_key(line):
+    return DIGITS.sub('#', ' '.join(line.split()))
+
+def has_letters(line):
+    return LETTERS.search(line) is not None
+
+
+# Repeated lines of one document. Pages are observed as they come in, so a
+# document can be translated in several batches with the same instance.
+class RepeatedLines:
+    def __init__(self, min_pages=MIN_PAGES):
+        self.min_pages = min_pages
+        self.counts = collections.Counter()  # (zone, key) -> pages it was seen on
+        self.canonical = {}  # key -> first copy of the line, stripped
+
+    def observe(self, page):
+        lines = [line for line in page.split('\n') if line.strip()]
+        keys = set()
+        for zone, zone_lines in ((TOP, lines[:ZONE_LINES]), (BOTTOM, lines[-ZONE_LINES:])):
+            for line in zone_lines:
+                key = line_key(line)
+                keys.add((zone, key))
+                self.canonical.setdefault(key, line.strip())
+        self.counts.update(keys)
+
+    def is_repeated(self, zone, line):
+        return self.counts[(zone, line_key(line))] >= self.min_pages
+
+    # Splits the lines of a page into (top, body, bottom): the runs of
+    # repeated lines (and blank lines between them) at either end and the
+    # lines in between. Together they are the page's lines in order.
+    def split(self, page):
+        lines = page.split('\n')
+        top = self._run_length(TOP, lines)
+        bottom = self._run_length(BOTTOM, lines[top:][::-1])
+        body_end = len(lines) - bottom
+        return lines[:top], lines[top:body_end], lines[body_end:]
+
+    # Number of lines from the start of `lines` up to the last repeated line
+    # of the run of repeated and blank lines there
+    def _run_length(self, zone, lines):
+        length = 0
+        repeated = 0
+        for index, line in enumerate(lines):
+            if not line.strip():
+                continue
+            if repeated == ZONE_LINES or not self.is_repeated(zone, line):
+                break
+            repeated += 1
+            length = index + 1
+        return length
+
+    # The text translated for a repeated line: the first copy of the line,
+    # which copies differing only in digits share
+    def source_line(self, line):
+        return self.canonical[line_key(line)]
+
+    # A repeated line in the target language, from the translation of its
+    # first copy. The page's own digits replace those of the first copy when
+    # the translation kept them in order. None when the line has to be
+    # translated by itself.
+    def translate_line(self, line, translations):
+        stripped = line.strip()
+        source = self.source_line(line)
+        translation = translations.get(source)
+        if translation is None:
+            return None
+        if stripped != source:
+            if DIGITS.findall(translation) != DIGITS.findall(source):
+                return None
+            digits = iter(DIGITS.findall(stripped))
+            translation = DIGITS.sub(lambda match: next(digits), translation)
+        return restore_whitespace(line, translation)
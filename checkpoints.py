@@ -0,0 +1,78 @@
+# checkpoints.py
+# Per-page checkpoints for OCR jobs, so a cancelled or crashed job resumes
+# where it stopped when the same file is opened again.
+#
+# A checkpoint is a JSON-lines file under <app data>/checkpoints named after
+# the hash of the PDF bytes. The first line holds the OCR parameters, every
+# further line one recognized page. Lines are appended as pages finish, so at
+# most the page being written is lost; a torn last line is ignored. The file
+# is removed once the job has completed.
+
+import os
+import json
+from ocr_cache import hash_file
+from settings import get_app_dir
+
+
+def get_checkpoint_dir():
+    checkpoint_dir = os.path.join(get_app_dir(), "checkpoints")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    return checkpoint_dir
+
+
+class JobCheckpoint:
+    def __init__(self, path, params):
+        self.path = path
+        self.header = json.dumps({'params': params}, sort_keys=True)
+        self.pages = {}  # page index -> text
+        self._load()
+
+    @classmethod
+    def for_document(cls, pdf_path, params):
+        return cls(os.path.join(get_checkpoint_dir(), hash_file(pdf_path) + ".jsonl"), params)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            return
+        # Pages recognized with other parameters cannot be reused, and a header
+        # torn by a crash while the first page was written leaves nothing to
+        # resume from
+        try:
+            header = json.dumps(json.loads(lines[0]), sort_keys=True) if lines else None
+        except json.JSONDecodeError:
+            header = None
+        if header != self.header:
+            self.discard()
+            return
+        for valid, line in enumerate(lines[1:], start=1):
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn write from a crash: cut it off so new pages are
+                # appended after the last complete one
+                with open(self.path, 'w', encoding='utf-8') as file:
+                    file.write("\n".join(lines[:valid]) + "\n")
+                break
+            self.pages[entry['page']] = entry['text']
+
+    def add(self, page_index, text):
+        is_new = not os.path.exists(self.path)
+        with open(self.path, 'a', encoding='utf-8') as file:
+            if is_new:
+                file.write(self.header + "\n")
+            file.write(json.dumps({'page': page_index, 'text': text}) + "\n")
+        self.pages[page_index] = text
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.pages = {}
+
+    # The job finished; nothing left to resume
+    def complete(self):
+        self.discard()
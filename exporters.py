@@ -0,0 +1,140 @@
+# exporters.py
+# Writers for recognized and translated text that take the document one page
+# at a time, as pages finish, instead of one big string at the end.
+#
+#   docx   one section per page (each starting on a new page), one paragraph
+#          per blank-line separated block of the page text
+#   txt    plain text, pages separated by form feeds (like pdftotext)
+#   jsonl  one JSON object per page: {"page": 1, "text": ..., <extra fields>}
+#
+# txt and jsonl are streamed to disk and are the fast choice for bulk runs;
+# a DOCX is a zip archive, so it is built up in memory page by page and only
+# serialized on close. Every exporter writes to a temporary file that replaces
+# the target on close(), so a cancelled or failed export never leaves a
+# half-written file behind.
+
+import os
+import re
+import json
+import time
+from metrics import metrics
+
+EXPORT_FORMATS = ('docx', 'txt', 'jsonl')
+
+PARAGRAPH_SEPARATOR = re.compile(r'\n\s*\n')
+# Control characters are not allowed in DOCX XML (OCR output ends pages with \f)
+XML_INVALID_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+PAGE_SEPARATOR = '\f'
+
+
+class Exporter:
+    format = None
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.pages = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def add_page(self, text, **fields):
+        started = time.perf_counter()
+        self._write_page(text, fields)
+        self.pages += 1
+        metrics.observe('export_seconds', time.perf_counter() - started, format=self.format)
+
+    # Finishes the file and moves it into place
+    def close(self):
+        started = time.perf_counter()
+        self._finish()
+        os.replace(self.temp_path, self.path)
+        metrics.observe('export_seconds', time.perf_counter() - started, format=self.format)
+        metrics.count('export_bytes_total', os.path.getsize(self.path), format=self.format)
+
+    # Drops everything written so far
+    def abort(self):
+        self._discard()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write_page(self, text, fields):
+        raise NotImplementedError
+
+    def _finish(self):
+        raise NotImplementedError
+
+    def _discard(self):
+        self._finish()
+
+
+class TextExporter(Exporter):
+    format = 'txt'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(self.temp_path, 'w', encoding='utf-8')
+
+    def _write_page(self, text, fields):
+        if self.pages:
+            self.file.write(PAGE_SEPARATOR)
+        # Form feeds inside a page (tesseract ends pages with one) would read as page breaks
+        self.file.write(text.replace(PAGE_SEPARATOR, ''))
+
+    def _finish(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class JsonlExporter(TextExporter):
+    format = 'jsonl'
+
+    def _write_page(self, text, fields):
+        self.file.write(json.dumps(dict({'page': self.pages + 1, 'text': text}, **fields), ensure_ascii=False) + "\n")
+
+
+class DocxExporter(Exporter):
+    format = 'docx'
+
+    def __init__(self, path):
+        super().__init__(path)
+        from docx import Document
+        self.document = Document()
+
+    def _write_page(self, text, fields):
+        from docx.enum.section import WD_SECTION
+        if self.pages:
+            self.document.add_section(WD_SECTION.NEW_PAGE)
+        for paragraph in PARAGRAPH_SEPARATOR.split(XML_INVALID_CHARACTERS.sub('', text)):
+            # Single line breaks inside a block become line breaks in the paragraph
+            if paragraph.strip():
+                self.document.add_paragraph(paragraph.strip('\n'))
+
+    def _finish(self):
+        if self.document is not None:
+            self.document.save(self.temp_path)
+            self.document = None
+
+    def _discard(self):
+        self.document = None
+
+
+EXPORTERS = {exporter.format: exporter for exporter in (DocxExporter, TextExporter, JsonlExporter)}
+
+
+# Exporter for `path`; the format defaults to the file extension
+def create_exporter(path, export_format=None):
+    if export_format is None:
+        export_format = os.path.splitext(path)[1].lstrip('.').lower()
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of: {', '.join(EXPORT_FORMATS)}")
+    return EXPORTERS[export_format](path)
@@ -0,0 +1,92 @@
+# job_queue.py
+# Documents waiting for OCR and the policy deciding which run next.
+#
+# Queued documents start smallest first (by page count), so a short letter is
+# not stuck behind a 500-page scan. The OCR of all running documents shares
+# one worker pool, which caps the CPU use; how many documents run at the same
+# time is bounded by max_parallel_jobs and by the memory their page images may
+# take. A single document always runs, whatever its estimate.
+
+import os
+import itertools
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+_job_ids = itertools.count(1)
+
+
+class Job:
+    def __init__(self, pdf_path):
+        self.id = next(_job_ids)
+        self.pdf_path = pdf_path
+        self.name = os.path.basename(pdf_path)
+        self.page_count = None  # counted in the background after queueing
+        self.settings = None  # OCR settings in effect when the job was queued
+        self.status = QUEUED
+        self.message = ''  # reason for FAILED
+        self.pages_recognized = 0
+        self.pages_translated = 0
+        self.source_summary = ''
+        self.texts = []  # cleaned page texts
+        self.translated_texts = []
+
+    # Smaller documents first, then in the order they were added
+    def priority(self):
+        return (self.page_count, self.id)
+
+    def is_finished(self):
+        return self.status in (DONE, CANCELLED, FAILED)
+
+
+class JobQueue:
+    def __init__(self, max_parallel_jobs=2, memory_limit_bytes=1024 * 1024 * 1024):
+        self.jobs = []
+        self.max_parallel_jobs = max(1, max_parallel_jobs)
+        self.memory_limit_bytes = memory_limit_bytes
+
+    def add(self, pdf_path):
+        job = Job(pdf_path)
+        self.jobs.append(job)
+        return job
+
+    def get(self, job_id):
+        for job in self.jobs:
+            if job.id == job_id:
+                return job
+        return None
+
+    # The queued or running job of a document, if there is one
+    def unfinished_job(self, pdf_path):
+        for job in self.jobs:
+            if not job.is_finished() and os.path.realpath(job.pdf_path) == os.path.realpath(pdf_path):
+                return job
+        return None
+
+    def with_status(self, status):
+        return [job for job in self.jobs if job.status == status]
+
+    # Marks the jobs that may start now as running and returns them.
+    # `memory_estimate(job)` is the estimated peak memory of the job while it
+    # runs, which depends on its settings (DPI, adaptive OCR).
+    def next_jobs(self, memory_estimate):
+        running_jobs = self.with_status(RUNNING)
+        running = len(running_jobs)
+        memory = sum(memory_estimate(job) for job in running_jobs)
+        ready = sorted((job for job in self.with_status(QUEUED) if job.page_count is not None),
+                       key=Job.priority)
+        started = []
+        for job in ready:
+            if running >= self.max_parallel_jobs:
+                break
+            job_memory = memory_estimate(job)
+            if running and memory + job_memory > self.memory_limit_bytes:
+                break
+            job.status = RUNNING
+            running += 1
+            memory += job_memory
+            started.append(job)
+        return started
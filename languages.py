@@ -4,6 +4,7 @@
 # encompassing Mandarin, Cantonese, and other dialects. For Norwegian, the code 'NO' is used, 
 # which does not distinguish between Bokmål and Nynorsk.
 
+import os
 import platform
 import subprocess
 
@@ -253,13 +254,13 @@ def get_macos_system_language():
 
 # Get the system language Linux
 def get_linux_system_language():
-    try:
-        lang = subprocess.check_output(
-            "echo $LANG", shell=True
-        ).strip().decode('utf-8')
-        return lang.split('.')[0]  # Removes encoding part
-    except subprocess.SubprocessError:
-        return None
+    # Read the locale straight from the environment, in the order the C
+    # library consults it, instead of spawning a shell
+    for variable in ('LC_ALL', 'LC_MESSAGES', 'LANG'):
+        lang = os.environ.get(variable)
+        if lang and lang not in ('C', 'POSIX'):
+            return lang.split('.')[0]  # Removes encoding part
+    return None
 
 def get_system_language():
     os_name = platform.system()
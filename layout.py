@@ -0,0 +1,182 @@
+# layout.py
+# Splits a large page image into text blocks, so the blocks of one page can be
+# recognized in parallel instead of in one long tesseract call.
+#
+# The page is reduced to an ink mask a few times smaller than the image (a
+# cell holds ink if any of its pixels does) and cut recursively along empty
+# bands (XY-cut):
+#   columns   vertical bands at least COLUMN_GAP_GLYPHS glyphs wide, cut left
+#             to right
+#   sections  horizontal bands at least PARAGRAPH_GAP_GLYPHS glyphs high, cut
+#             top to bottom
+# Each region is cut along its widest bands, so the leaves come out in
+# reading order. Consecutive leaves stacked in the same column are then merged
+# again up to MAX_BLOCK_PIXELS, and blocks above it (a long receipt, a column
+# of a plan) are split between text lines, so the blocks are few and of
+# similar size. Cutting only along bands without any ink never splits a glyph.
+
+import numpy as np
+import cv2
+
+ANALYSIS_WIDTH = 2000  # cells across the ink mask
+COLUMN_GAP_GLYPHS = 3.0
+PARAGRAPH_GAP_GLYPHS = 1.5
+WIDEST_GAP_SHARE = 0.8  # gaps this close to the widest one are cut together
+MIN_BLOCK_PIXELS = 250_000  # smaller regions are not cut any further
+MAX_BLOCK_PIXELS = 2_000_000  # larger blocks are split between text lines
+BLOCK_MARGIN = 16  # pixels of white added around every block for tesseract
+
+
+# A rectangle of the page in image pixels. `uniform` blocks hold a single run
+# of text lines (no column inside) and can be recognized with tesseract's
+# single-block page segmentation mode.
+class TextBlock:
+    def __init__(self, left, top, right, bottom, uniform):
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+        self.uniform = uniform
+
+    def pixels(self):
+        return (self.right - self.left) * (self.bottom - self.top)
+
+
+# (start, end) ranges of the runs of True in a 1-D mask
+def _runs(mask):
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+# Empty bands strictly inside a region at least `min_width` cells wide
+def _gaps(has_ink, min_width=1):
+    return [(start, end) for start, end in _runs(~has_ink)
+            if start > 0 and end < has_ink.size and end - start >= min_width]
+
+def _area(cell):
+    return (cell[2] - cell[0]) * (cell[3] - cell[1])
+
+# Boolean ink mask of `gray` at most ANALYSIS_WIDTH cells wide, and the number
+# of image pixels per cell
+def ink_mask(gray):
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    step = max(1, -(-gray.shape[1] // ANALYSIS_WIDTH))
+    if step > 1:
+        height, width = ink.shape
+        ink = cv2.resize(ink, (width // step, height // step), interpolation=cv2.INTER_AREA)
+    return ink > 0, step
+
+# Median height of the ink components in cells, about the height of a letter
+def glyph_height(mask):
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    heights = heights[heights >= 2]
+    return float(np.median(heights)) if heights.size else 1.0
+
+
+# Text blocks of a grayscale or binarized page in reading order; an empty
+# list when the page holds no ink
+def find_text_blocks(gray):
+    mask, step = ink_mask(gray)
+    if not mask.any():
+        return []
+    glyph = glyph_height(mask)
+    column_gap = max(2, round(glyph * COLUMN_GAP_GLYPHS))
+    paragraph_gap = max(2, round(glyph * PARAGRAPH_GAP_GLYPHS))
+    max_cells = MAX_BLOCK_PIXELS / step ** 2
+
+    leaves = []
+    _xy_cut(mask, (0, 0, mask.shape[1], mask.shape[0]), column_gap, paragraph_gap, MIN_BLOCK_PIXELS / step ** 2,
+            leaves)
+    cells = []
+    for cell in _merge_stacked(leaves, max_cells):
+        if cell[4] and _area(cell) > max_cells:
+            cells.extend(_split_lines(mask, cell, max_cells))
+        else:
+            cells.append(cell)
+
+    height, width = gray.shape
+    return [TextBlock(left * step, top * step, min(width, right * step), min(height, bottom * step), uniform)
+            for left, top, right, bottom, uniform in cells]
+
+# Appends the leaves of a region to `leaves` in reading order, each trimmed to
+# its ink, as (left, top, right, bottom, uniform) cell coordinates
+def _xy_cut(mask, region, column_gap, paragraph_gap, min_cells, leaves):
+    left, top, right, bottom = region
+    rows = mask[top:bottom, left:right].any(axis=1)
+    if not rows.any():
+        return
+    columns = mask[top:bottom, left:right].any(axis=0)
+    # Trim the empty margin, so gaps are only looked for between text
+    top, bottom = top + int(np.argmax(rows)), top + len(rows) - int(np.argmax(rows[::-1]))
+    left, right = left + int(np.argmax(columns)), left + len(columns) - int(np.argmax(columns[::-1]))
+    if (right - left) * (bottom - top) < min_cells:
+        # Too small to be worth cutting; may still hold columns
+        leaves.append((left, top, right, bottom, False))
+        return
+
+    column_gaps = _gaps(mask[top:bottom, left:right].any(axis=0), column_gap)
+    row_gaps = _gaps(mask[top:bottom, left:right].any(axis=1), paragraph_gap)
+    widest_column_gap = max((end - start for start, end in column_gaps), default=0)
+    widest_row_gap = max((end - start for start, end in row_gaps), default=0)
+    # Cut along the widest gaps only, in whichever direction they are: the
+    # gutter between columns before the word gaps of a heading above them,
+    # the gap below a heading before paragraph breaks that happen to line up
+    # across columns
+    if column_gaps and widest_column_gap >= widest_row_gap:
+        edges = [left] + [left + x for start, end in column_gaps
+                          if end - start >= widest_column_gap * WIDEST_GAP_SHARE for x in (start, end)] + [right]
+        for start, end in zip(edges[::2], edges[1::2]):
+            _xy_cut(mask, (start, top, end, bottom), column_gap, paragraph_gap, min_cells, leaves)
+        return
+    if row_gaps:
+        edges = [top] + [top + y for start, end in row_gaps
+                         if end - start >= widest_row_gap * WIDEST_GAP_SHARE for y in (start, end)] + [bottom]
+        for start, end in zip(edges[::2], edges[1::2]):
+            _xy_cut(mask, (left, start, right, end), column_gap, paragraph_gap, min_cells, leaves)
+        return
+    leaves.append((left, top, right, bottom, True))
+
+# Merges each leaf into the block before it while the block stays below
+# `max_cells`, the leaf lies below it and their bounding box takes in no
+# other leaf. The reading order is kept.
+def _merge_stacked(leaves, max_cells):
+    if not leaves:
+        return []
+    boxes = np.array([leaf[:4] for leaf in leaves])
+    blocks = [leaves[0]]
+    first = 0  # index of the first leaf in the last block
+    for index, leaf in enumerate(leaves[1:], start=1):
+        last = blocks[-1]
+        union = (min(last[0], leaf[0]), last[1], max(last[2], leaf[2]), max(last[3], leaf[3]), last[4] and leaf[4])
+        if leaf[1] >= last[3] and _area(union) <= max_cells:
+            inside = ((boxes[:, 0] < union[2]) & (boxes[:, 2] > union[0]) &
+                      (boxes[:, 1] < union[3]) & (boxes[:, 3] > union[1]))
+            inside[first:index + 1] = False
+            if not inside.any():
+                blocks[-1] = union
+                continue
+        blocks.append(leaf)
+        first = index
+    return blocks
+
+# Splits a block of text lines into pieces of at most about `max_cells`,
+# cutting in the empty rows between lines closest to equal-sized pieces
+def _split_lines(mask, cell, max_cells):
+    left, top, right, bottom, uniform = cell
+    gaps = _gaps(mask[top:bottom, left:right].any(axis=1))
+    pieces = int(np.ceil(_area(cell) / max_cells))
+    if not gaps or pieces < 2:
+        return [cell]
+    centers = np.array([(start + end) // 2 for start, end in gaps])
+    height = bottom - top
+    targets = [height * piece / pieces for piece in range(1, pieces)]
+    cuts = sorted({int(centers[np.argmin(np.abs(centers - target))]) for target in targets})
+    edges = [0] + cuts + [height]
+    return [(left, top + start, right, top + end, uniform) for start, end in zip(edges, edges[1:]) if end > start]
+
+# The block's pixels with a white margin around them, as a new contiguous image
+def block_image(gray, block):
+    pixels = gray[block.top:block.bottom, block.left:block.right]
+    return cv2.copyMakeBorder(pixels, BLOCK_MARGIN, BLOCK_MARGIN, BLOCK_MARGIN, BLOCK_MARGIN,
+                              cv2.BORDER_CONSTANT, value=255)
@@ -0,0 +1,123 @@
+# metrics.py
+# Lightweight in-process instrumentation: counters and timers keyed by a name
+# and optional labels, e.g. stage="ocr". The hot paths (rasterization,
+# preprocessing and OCR per page, DeepL requests, DOCX export) record into the
+# process-wide `metrics` registry; the GUI shows it in its diagnostics panel
+# and it can be written out as JSON or in the Prometheus text format (for a
+# node_exporter textfile collector, say).
+#
+# Recording is a dict update under a lock, cheap enough to do per page.
+
+import os
+import json
+import time
+import threading
+import contextlib
+
+PROMETHEUS_PREFIX = "ocr_tool_"
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+def _format_name(name, labels):
+    return name + _format_labels(labels)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}  # (name, labels) -> value
+        self.timers = {}  # (name, labels) -> [count, total seconds, max seconds]
+
+    # Adds `value` to a counter (pages, bytes, requests, ...)
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # Records one duration in seconds
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            counters = {_format_name(name, labels): value for (name, labels), value in sorted(self.counters.items())}
+            timers = {
+                _format_name(name, labels): {
+                    'count': count,
+                    'total_seconds': round(total, 4),
+                    'mean_ms': round(total * 1000 / count, 2),
+                    'max_ms': round(maximum * 1000, 2),
+                }
+                for (name, labels), (count, total, maximum) in sorted(self.timers.items())
+            }
+        return {'since': self.started, 'counters': counters, 'timers': timers}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    # Counters as Prometheus counters, timers as summaries (_count and _sum)
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for (name, labels), (count, total, _) in timers:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} summary")
+                typed.add(metric)
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+    # Writes the metrics atomically; .prom and .txt files get the Prometheus
+    # text format, anything else JSON
+    def export(self, path):
+        is_prometheus = os.path.splitext(path)[1].lower() in ('.prom', '.txt')
+        content = self.to_prometheus() if is_prometheus else self.to_json()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+
+
+# Process-wide registry
+metrics = Metrics()
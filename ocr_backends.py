@@ -0,0 +1,112 @@
+# ocr_backends.py
+# OCR backends behind a common image_to_string(image) interface.
+#
+# - tesserocr: binds libtesseract in-process. The language model is loaded
+#   once per worker and images are passed as in-memory buffers.
+# - pytesseract: runs the tesseract binary per page, writing the image to a
+#   temporary file and reloading the traineddata every time. Always available
+#   and used as the fallback.
+#
+# tesserocr is optional (pip install tesserocr); "auto" picks it when present.
+#
+# image_to_data(image) returns the text together with the confidence (0-100)
+# of every recognized word, from the same single recognition.
+
+import re
+import threading
+import functools
+import numpy as np
+
+BACKEND_NAMES = ('auto', 'tesserocr', 'pytesseract')
+
+# Backends are not thread-safe, so every thread of every worker process gets
+# its own instances
+_local = threading.local()
+
+# Level of the word rows in tesseract's TSV output
+WORD_LEVEL = 5
+
+
+class PytesseractBackend:
+    name = 'pytesseract'
+
+    def __init__(self, lang=None, config=''):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.config = config
+
+    def image_to_string(self, image):
+        return self._pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+
+    # The text is put together from the word rows: the lines as recognized,
+    # a blank line between paragraphs, like the plain text output
+    def image_to_data(self, image):
+        data = self._pytesseract.image_to_data(image, lang=self.lang, config=self.config,
+                                               output_type=self._pytesseract.Output.DICT)
+        paragraphs = {}  # (block, paragraph) -> line -> words
+        confidences = []
+        rows = zip(data['level'], data['block_num'], data['par_num'], data['line_num'], data['conf'], data['text'])
+        for level, block, paragraph, line, confidence, word in rows:
+            if level != WORD_LEVEL or not word.strip():
+                continue
+            paragraphs.setdefault((block, paragraph), {}).setdefault(line, []).append(word)
+            if float(confidence) >= 0:
+                confidences.append(float(confidence))
+        text = "\n\n".join("\n".join(" ".join(words) for words in lines.values()) for lines in paragraphs.values())
+        return (text + "\n" if text else ""), confidences
+
+
+class TesserocrBackend:
+    name = 'tesserocr'
+
+    def __init__(self, lang=None, config=''):
+        import tesserocr
+        # Only the page segmentation mode of the tesseract CLI config is mapped
+        match = re.search(r'--psm\s+(\d+)', config or '')
+        psm = int(match.group(1)) if match else tesserocr.PSM.AUTO
+        self.api = tesserocr.PyTessBaseAPI(lang=lang or 'eng', psm=psm)
+
+    def image_to_string(self, image):
+        # numpy buffers are handed over directly; no temp file, no re-encoding
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        self.api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+        return self.api.GetUTF8Text()
+
+    def image_to_data(self, image):
+        text = self.image_to_string(image)
+        return text, [float(confidence) for confidence in self.api.AllWordConfidences()]
+
+
+@functools.lru_cache(maxsize=None)
+def tesserocr_available():
+    try:
+        import tesserocr  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def resolve_backend_name(name):
+    if name == 'auto' or name not in BACKEND_NAMES:
+        return 'tesserocr' if tesserocr_available() else 'pytesseract'
+    if name == 'tesserocr' and not tesserocr_available():
+        return 'pytesseract'
+    return name
+
+def create_backend(name, lang=None, config=''):
+    if resolve_backend_name(name) == 'tesserocr':
+        return TesserocrBackend(lang, config)
+    return PytesseractBackend(lang, config)
+
+# Returns this thread's backend, creating it (and loading the model) only once
+def get_backend(name, lang=None, config=''):
+    backends = getattr(_local, 'backends', None)
+    if backends is None:
+        backends = _local.backends = {}
+    key = (resolve_backend_name(name), lang, config)
+    backend = backends.get(key)
+    if backend is None:
+        backend = backends[key] = create_backend(name, lang, config)
+    return backend
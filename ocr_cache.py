@@ -0,0 +1,104 @@
+# ocr_cache.py
+# Content-addressed on-disk cache for per-page OCR text.
+# A page is keyed by the hash of the PDF bytes, its index and every parameter
+# that influences the recognized text (DPI, preprocessing, tesseract settings).
+# Entries are plain text files; the least recently used ones are evicted once
+# the cache grows beyond its size limit.
+
+import os
+import json
+import hashlib
+import functools
+from settings import get_app_dir
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def get_ocr_cache_dir():
+    cache_dir = os.path.join(get_app_dir(), "ocr_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+# The file is only read again when its size or modification time changed
+def hash_file(path):
+    stat = os.stat(path)
+    return _hash_file(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+@functools.lru_cache(maxsize=64)
+def _hash_file(path, size, mtime_ns, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Cache configured from the persisted settings, or None when disabled
+def cache_from_settings(settings):
+    max_mb = settings.get('ocr_cache_max_mb', 0)
+    if max_mb <= 0:
+        return None
+    return OCRCache(max_bytes=max_mb * 1024 * 1024)
+
+
+class OCRCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or get_ocr_cache_dir()
+        self.max_bytes = max_bytes
+        self._size = None  # total bytes on disk, scanned on first write
+
+    @staticmethod
+    def page_key(document_hash, page_index, params):
+        payload = json.dumps([document_hash, page_index, params], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                text = file.read()
+        except FileNotFoundError:
+            return None
+        # Refresh the access time used for LRU eviction
+        os.utime(path)
+        return text
+
+    def put(self, key, text):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_path, path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".txt"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    yield path, stat.st_size, stat.st_mtime
+
+    # Remove least recently used entries until the cache fits its limit
+    def evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
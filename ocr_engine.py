@@ -0,0 +1,655 @@
+# ocr_engine.py
+# Page-parallel OCR. Pages are rasterized a few at a time, spread across a
+# pool of worker processes and the recognized text is handed back in page order.
+
+import os
+import time
+import itertools
+import threading
+import subprocess
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import cv2
+from pdf2image import convert_from_path, pdfinfo_from_path
+from ocr_backends import get_backend, resolve_backend_name
+from layout import block_image, find_text_blocks
+from metrics import metrics
+from ocr_cache import cache_from_settings, hash_file
+from page_classifier import BLANK, DUPLICATE, PageClassifier, SkippedPage
+from preprocessing import get_preprocessor, merge_config
+
+# Pages decoded per poppler call; bounds the number of page images in RAM
+RASTER_CHUNK_PAGES = 4
+
+# Parameters that determine the recognized text; they are part of every
+# OCR cache key, so changing one of them invalidates the cached pages
+DEFAULT_DPI = 200  # or 'auto', see choose_dpi
+TESSERACT_LANG = None  # tesseract default (eng)
+TESSERACT_CONFIG = ''
+
+# Block OCR: pages of at least BLOCK_OCR_MIN_MEGAPIXELS (an A0 plan, a long
+# receipt) are split into text blocks (see layout.py) that are recognized
+# concurrently, uniform blocks in tesseract's single-block mode (--psm 6)
+BLOCK_OCR_MIN_MEGAPIXELS = 12
+BLOCK_TESSERACT_CONFIG = (TESSERACT_CONFIG + ' --psm 6').strip()
+
+# Adaptive OCR: every page gets a fast first pass at the configured DPI.
+# Pages whose mean word confidence stays below ADAPTIVE_MIN_CONFIDENCE (or
+# that yield no word at all) are rendered again at ADAPTIVE_RETRY_DPI and
+# recognized with RETRY_PREPROCESSING; the pass with the higher confidence wins.
+ADAPTIVE_MIN_CONFIDENCE = 70
+ADAPTIVE_RETRY_DPI = 300
+RETRY_PREPROCESSING = {
+    'stages': ['denoise', 'deskew', 'threshold', 'crop_border'],
+    'threshold_method': 'adaptive',
+}
+
+# Automatic DPI: a few pages are probed at PROBE_DPI and the document is
+# rendered so that its median glyph comes out AUTO_DPI_GLYPH_PX pixels high.
+# Tesseract's accuracy drops quickly below that, while larger text only costs
+# rasterization and OCR time (both scale with the pixel count).
+PROBE_DPI = 72
+PROBE_PAGES = 3
+AUTO_DPI_GLYPH_PX = 20
+AUTO_DPI_MIN = 100
+AUTO_DPI_MAX = 400
+AUTO_DPI_STEP = 25
+MIN_PROBE_GLYPHS = 20
+
+# Pages whose text layer has fewer non-whitespace characters than this are
+# treated as image-only and go through OCR
+TEXT_LAYER_MIN_CHARS = 20
+
+# Where each page's text came from
+SOURCE_TEXT_LAYER = 'text_layer'
+SOURCE_CHECKPOINT = 'checkpoint'
+SOURCE_CACHE = 'cache'
+SOURCE_OCR = 'ocr'
+SOURCE_BLANK = BLANK  # skipped, no text
+SOURCE_DUPLICATE = DUPLICATE  # skipped, text of an identical earlier page
+
+
+def get_page_count(pdf_path):
+    return pdfinfo_from_path(pdf_path)["Pages"]
+
+# Text layer of every page, extracted by poppler's pdftotext (installed
+# together with pdftoppm, which pdf2image uses). pdftotext separates pages
+# with form feeds. Returns None when pdftotext is not available.
+def extract_text_layer(pdf_path, page_count):
+    try:
+        output = subprocess.run(["pdftotext", "-enc", "UTF-8", pdf_path, "-"],
+                                capture_output=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    pages = output.decode('utf-8', errors='replace').split('\f')[:page_count]
+    return pages + [''] * (page_count - len(pages))
+
+def has_text_layer(text):
+    return len(''.join(text.split())) >= TEXT_LAYER_MIN_CHARS
+
+# Groups sorted 0-based page indexes into (first_page, last_page) ranges of
+# consecutive 1-based page numbers, each at most chunk_size pages long
+def page_ranges(pages, chunk_size):
+    ranges = []
+    for page in pages:
+        # ranges hold 1-based numbers, so the next 0-based index equals the last page
+        if ranges and page == ranges[-1][1] and ranges[-1][1] - ranges[-1][0] + 1 < chunk_size:
+            ranges[-1][1] = page + 1
+        else:
+            ranges.append([page + 1, page + 1])
+    return [tuple(page_range) for page_range in ranges]
+
+# Yields the pages of a PDF one PIL image at a time. Only chunk_size pages are
+# decoded per poppler call, so memory stays flat regardless of document length.
+# `pages` restricts rasterization to the given 0-based page indexes. Poppler
+# renders grayscale directly (1 byte per pixel instead of 3), which is all
+# the OCR pipeline needs.
+def rasterize_pages(pdf_path, pages=None, chunk_size=RASTER_CHUNK_PAGES, dpi=DEFAULT_DPI, grayscale=True):
+    if pages is None:
+        pages = range(get_page_count(pdf_path))
+    for first_page, last_page in page_ranges(sorted(pages), chunk_size):
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                                   grayscale=grayscale)
+        while images:
+            # Drop our reference as soon as the page is handed out
+            yield images.pop(0)
+
+
+# Crops a PIL page to `region`, given as (left, top, right, bottom) fractions
+# of the page size, e.g. (0, 0.1, 1, 0.9) drops the top and bottom tenth
+def crop_page(image, region):
+    if region is None:
+        return image
+    left, top, right, bottom = region
+    width, height = image.size
+    return image.crop((round(left * width), round(top * height), round(right * width), round(bottom * height)))
+
+def validate_crop_region(region):
+    if region is None:
+        return None
+    region = tuple(float(value) for value in region)
+    if len(region) != 4 or not (0 <= region[0] < region[2] <= 1 and 0 <= region[1] < region[3] <= 1):
+        raise ValueError(f"Invalid crop region {region}: expected left, top, right, bottom fractions in [0, 1]")
+    return region
+
+# Median height in pixels of the glyphs on a grayscale page, or None when the
+# page holds too little text to tell. At probe resolution neighbouring letters
+# often merge, which leaves the height (roughly the ascender height) intact.
+def estimate_glyph_height(gray):
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Specks, rules, table borders and pictures are not glyphs
+    glyphs = heights[(heights >= 2) & (heights <= gray.shape[0] // 20) & (widths <= heights * 20)]
+    if glyphs.size < MIN_PROBE_GLYPHS:
+        return None
+    return float(np.median(glyphs))
+
+# DPI at which the glyphs of the given pages come out AUTO_DPI_GLYPH_PX high,
+# judged from low-resolution probe renders of up to PROBE_PAGES of them.
+# Falls back to DEFAULT_DPI when no probe page holds enough text.
+def choose_dpi(pdf_path, pages, crop_region=None):
+    if not pages:
+        return DEFAULT_DPI
+    step = max(1, len(pages) // PROBE_PAGES)
+    heights = []
+    for page_index in pages[::step][:PROBE_PAGES]:
+        probe = convert_from_path(pdf_path, dpi=PROBE_DPI, first_page=page_index + 1, last_page=page_index + 1,
+                                  grayscale=True)[0]
+        height = estimate_glyph_height(page_to_gray_array(crop_page(probe, crop_region)))
+        if height is not None:
+            heights.append(height)
+    if not heights:
+        return DEFAULT_DPI
+    dpi = PROBE_DPI * AUTO_DPI_GLYPH_PX / float(np.median(heights))
+    dpi = round(dpi / AUTO_DPI_STEP) * AUTO_DPI_STEP
+    return int(min(AUTO_DPI_MAX, max(AUTO_DPI_MIN, dpi)))
+
+
+# Accepts a BGR or grayscale page. The result lives in a buffer that is reused
+# by the next call from the same thread.
+def preprocess_image(image, config=None):
+    return get_preprocessor(config).process(image)
+
+# Wraps a page as a 2-D uint8 array. np.asarray reuses the bytes Pillow
+# exports instead of copying them a second time like np.array does.
+def page_to_gray_array(image):
+    if isinstance(image, np.ndarray):
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    if image.mode != 'L':
+        image = image.convert('L')
+    return np.asarray(image)
+
+# One OCR pass over a page image: (text, word confidences, seconds per
+# stage). The single grayscale buffer goes through preprocessing into OCR.
+# The preprocessor buffers and the OCR backend are created on the first page
+# and reused for every later one. With `block_threads` the preprocessed page
+# is split into text blocks that are recognized on that many threads. Word
+# confidences are only collected (otherwise None) when `with_confidence`.
+def recognize_image(image, backend_name='auto', preprocess_config=None, block_threads=0, with_confidence=False):
+    gray = page_to_gray_array(image)
+    del image
+    preprocessor = get_preprocessor(preprocess_config)
+    preprocessed_image = preprocessor.process(gray)
+    timings = dict(preprocessor.last_timings)
+    if block_threads:
+        started = time.perf_counter()
+        blocks = find_text_blocks(preprocessed_image)
+        timings['layout'] = time.perf_counter() - started
+        if len(blocks) > 1:
+            started = time.perf_counter()
+            text, confidences = ocr_blocks(preprocessed_image, blocks, backend_name, block_threads, with_confidence)
+            timings['ocr'] = time.perf_counter() - started
+            return text, confidences, timings
+    backend = get_backend(backend_name, TESSERACT_LANG, TESSERACT_CONFIG)
+    started = time.perf_counter()
+    if with_confidence:
+        text, confidences = backend.image_to_data(preprocessed_image)
+    else:
+        text, confidences = backend.image_to_string(preprocessed_image), None
+    timings['ocr'] = time.perf_counter() - started
+    return text, confidences, timings
+
+def mean_confidence(confidences):
+    return round(sum(confidences) / len(confidences), 1) if confidences else None
+
+# Second pass for a page whose first pass came out below `min_confidence`:
+# the worker renders the page again at `dpi` and preprocesses it with
+# `preprocess_config`
+class RetryPass:
+    def __init__(self, pdf_path, page_index, dpi, crop_region, preprocess_config, min_confidence):
+        self.pdf_path = pdf_path
+        self.page_index = page_index
+        self.dpi = dpi
+        self.crop_region = crop_region
+        self.preprocess_config = preprocess_config
+        self.min_confidence = min_confidence
+
+# Runs inside a worker process: page image -> (text, seconds per stage,
+# quality). Quality holds the number of passes and, with a `retry` pass
+# (adaptive OCR), the mean word confidence of the text returned.
+def ocr_page(image, backend_name='auto', preprocess_config=None, block_threads=0, retry=None):
+    text, confidences, timings = recognize_image(image, backend_name, preprocess_config, block_threads,
+                                                 retry is not None)
+    del image
+    confidence = mean_confidence(confidences)
+    passes = 1
+    if retry is not None and (confidence is None or confidence < retry.min_confidence):
+        started = time.perf_counter()
+        page = next(rasterize_pages(retry.pdf_path, [retry.page_index], dpi=retry.dpi))
+        page = crop_page(page, retry.crop_region)
+        timings['rasterize'] = time.perf_counter() - started
+        retry_text, retry_confidences, retry_timings = recognize_image(page, backend_name, retry.preprocess_config,
+                                                                       block_threads, True)
+        del page
+        passes = 2
+        for stage, seconds in retry_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        retry_confidence = mean_confidence(retry_confidences)
+        if retry_confidence is not None and (confidence is None or retry_confidence > confidence):
+            text, confidence = retry_text, retry_confidence
+    return text, timings, {'confidence': confidence, 'passes': passes}
+
+_block_executor = (0, None)
+_block_executor_lock = threading.Lock()
+
+# Threads for the blocks of a page; kept for the life of the worker process,
+# so each thread creates its OCR backends (and loads the model) only once
+def get_block_executor(threads):
+    global _block_executor
+    with _block_executor_lock:
+        if _block_executor[0] != threads:
+            if _block_executor[1] is not None:
+                _block_executor[1].shutdown(wait=False)
+            _block_executor = (threads, ThreadPoolExecutor(max_workers=threads))
+        return _block_executor[1]
+
+# Recognizes the blocks of a page and joins their text in reading order, one
+# blank line between blocks; returns it with the word confidences of all
+# blocks (None unless `with_confidence`). The largest blocks are started
+# first, so no thread is left with a big block at the end. tesseract runs
+# outside the GIL with either backend.
+def ocr_blocks(gray, blocks, backend_name, threads, with_confidence=False):
+    def recognize(block):
+        config = BLOCK_TESSERACT_CONFIG if block.uniform else TESSERACT_CONFIG
+        backend = get_backend(backend_name, TESSERACT_LANG, config)
+        if with_confidence:
+            return backend.image_to_data(block_image(gray, block))
+        return backend.image_to_string(block_image(gray, block)), None
+
+    executor = get_block_executor(threads)
+    futures = {index: executor.submit(recognize, blocks[index])
+               for index in sorted(range(len(blocks)), key=lambda index: -blocks[index].pixels())}
+    results = [futures[index].result() for index in range(len(blocks))]
+    text = "\n\n".join(text.strip() for text, _ in results if text.strip()) + "\n"
+    if not with_confidence:
+        return text, None
+    return text, [confidence for _, confidences in results for confidence in confidences]
+
+# 0 (or anything below 1) means "use every core"
+def resolve_worker_count(workers):
+    if not workers or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+
+# Spawn instead of fork: the caller usually lives in a Qt thread and forking a
+# multithreaded GUI process is not safe on every platform.
+def create_worker_pool(workers):
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=resolve_worker_count(workers), mp_context=context)
+
+# Bytes held by one grayscale page image (US letter at `dpi`)
+def page_image_bytes(dpi=DEFAULT_DPI):
+    if dpi == 'auto':
+        dpi = AUTO_DPI_MAX
+    return int(8.5 * dpi) * int(11 * dpi)
+
+# Engine configured from the persisted settings; `workers` overrides the
+# ocr_workers setting when given, `pool` is a worker pool shared with other
+# engines
+def engine_from_settings(settings, workers=None, pool=None):
+    if workers is None:
+        workers = settings['ocr_workers']
+    return OCREngine(workers, cache_from_settings(settings), settings['ocr_backend'], settings['preprocessing'],
+                     settings['use_text_layer'], pool, settings['dpi'], settings['crop_region'],
+                     settings['skip_blank_pages'], settings['reuse_duplicate_pages'], settings['block_ocr'],
+                     settings['block_ocr_min_megapixels'], settings['adaptive_ocr'],
+                     settings['adaptive_min_confidence'], settings['adaptive_retry_dpi'],
+                     settings['adaptive_retry_preprocessing'])
+
+
+class OCREngine:
+    def __init__(self, workers=0, cache=None, backend='auto', preprocess_config=None, use_text_layer=True,
+                 pool=None, dpi=DEFAULT_DPI, crop_region=None, skip_blank_pages=True, reuse_duplicate_pages=True,
+                 block_ocr=False, block_ocr_min_megapixels=BLOCK_OCR_MIN_MEGAPIXELS, adaptive_ocr=False,
+                 adaptive_min_confidence=ADAPTIVE_MIN_CONFIDENCE, adaptive_retry_dpi=ADAPTIVE_RETRY_DPI,
+                 adaptive_retry_preprocessing=None):
+        self.workers = resolve_worker_count(workers)
+        # Without a shared pool, every document gets its own for its duration
+        self.pool = pool
+        self.cache = cache
+        self.use_text_layer = use_text_layer
+        # Source of each page of the last document yielded so far (SOURCE_* constants)
+        self.page_sources = []
+        self.backend = resolve_backend_name(backend)
+        self.preprocess_config = merge_config(preprocess_config)
+        # Seconds spent per stage over all pages recognized by this engine
+        self.stage_timings = {}
+        self.pages_timed = 0
+        # Pages submitted but not yet collected; caps how far the rasterizer
+        # may run ahead of the OCR workers
+        self.max_pending = self.workers * 2
+        # A number, or 'auto' to pick it per document from a probe render
+        self.dpi = dpi if dpi == 'auto' else int(dpi)
+        self.crop_region = validate_crop_region(crop_region)
+        self.skip_blank_pages = skip_blank_pages
+        self.reuse_duplicate_pages = reuse_duplicate_pages
+        self.block_ocr = block_ocr
+        self.block_ocr_min_megapixels = block_ocr_min_megapixels
+        # Pages of the current document that go to OCR; 0 when not known
+        self.pages_to_ocr = 0
+        self.adaptive_ocr = adaptive_ocr
+        self.adaptive_min_confidence = adaptive_min_confidence
+        self.adaptive_retry_dpi = int(adaptive_retry_dpi)
+        # Overrides of RETRY_PREPROCESSING, like preprocess_config overrides
+        # the default preprocessing
+        self.retry_preprocess_config = merge_config(dict(RETRY_PREPROCESSING, **(adaptive_retry_preprocessing or {})))
+        # OCR passes (0: not recognized in this run) and mean word confidence
+        # (None: not measured) of each page of the last document
+        self.page_passes = []
+        self.page_confidences = []
+        # Rasterized pixels, the pixels the same pages would have had as
+        # full pages at DEFAULT_DPI, and pages per DPI used
+        self.pixels_rasterized = 0
+        self.baseline_pixels = 0
+        self.pages_per_dpi = collections.Counter()
+
+    # Generator: pulls page images lazily from `images` and yields their text
+    # in page order. SkippedPage items are passed through in place.
+    def iter_pages(self, images):
+        for result in self._iter_results(images):
+            yield result if isinstance(result, SkippedPage) else result[0]
+
+    # Like iter_pages, but yields (text, quality) for recognized pages. Given
+    # the PDF and the index of every image, adaptive OCR can re-render pages.
+    def _iter_results(self, images, pdf_path=None, page_indexes=None):
+        if page_indexes is None:
+            page_indexes = itertools.count()
+        items = zip(page_indexes, images)
+        if self.pool is not None:
+            yield from self._iter_pool(self.pool, items, pdf_path)
+            return
+        if self.workers <= 1:
+            for page_index, image in items:
+                if isinstance(image, SkippedPage):
+                    yield image
+                else:
+                    yield self._collect(ocr_page(*self._ocr_args(image, pdf_path, page_index)))
+            return
+        with create_worker_pool(self.workers) as pool:
+            yield from self._iter_pool(pool, items, pdf_path)
+
+    def _iter_pool(self, pool, items, pdf_path):
+        pending = collections.deque()
+        try:
+            for page_index, image in items:
+                if isinstance(image, SkippedPage):
+                    pending.append(image)
+                else:
+                    pending.append(pool.submit(ocr_page, *self._ocr_args(image, pdf_path, page_index)))
+                del image
+                if len(pending) >= self.max_pending:
+                    yield self._result(pending.popleft())
+            while pending:
+                yield self._result(pending.popleft())
+        finally:
+            # When the consumer stops early (cancel), drop queued pages so
+            # shutting the pool down only waits for the running ones
+            for future in pending:
+                if not isinstance(future, SkippedPage):
+                    future.cancel()
+
+    # Arguments of ocr_page for a page image. With block OCR, large pages are
+    # split into blocks that get the cores the document's other pages leave
+    # idle: all of them for a single-page document. With adaptive OCR, pages
+    # of a PDF get a retry pass.
+    def _ocr_args(self, image, pdf_path=None, page_index=None):
+        block_threads = 0
+        if self.block_ocr:
+            height, width = image.shape[:2] if isinstance(image, np.ndarray) else (image.height, image.width)
+            if width * height >= self.block_ocr_min_megapixels * 1e6:
+                block_threads = max(1, self.workers // self.pages_to_ocr) if self.pages_to_ocr else 1
+        retry = None
+        if self.adaptive_ocr and pdf_path is not None:
+            retry = RetryPass(pdf_path, page_index, self.adaptive_retry_dpi, self.crop_region,
+                              self.retry_preprocess_config, self.adaptive_min_confidence)
+        return image, self.backend, self.preprocess_config, block_threads, retry
+
+    def _result(self, pending):
+        return pending if isinstance(pending, SkippedPage) else self._collect(pending.result())
+
+    # Upper bound for the page images one document holds at a time: a
+    # rasterized chunk plus the pages waiting for or in the OCR workers, and
+    # with adaptive OCR a page rendered again at the retry DPI per worker
+    def memory_estimate(self):
+        estimate = (RASTER_CHUNK_PAGES + self.max_pending) * page_image_bytes(self.dpi)
+        if self.adaptive_ocr:
+            estimate += self.workers * page_image_bytes(self.adaptive_retry_dpi)
+        return estimate
+
+    # Rasterizes and crops the given pages, timing poppler and counting pixels
+    def _rasterize(self, pdf_path, pages, dpi):
+        images = rasterize_pages(pdf_path, pages, dpi=dpi)
+        while True:
+            started = time.perf_counter()
+            try:
+                image = next(images)
+            except StopIteration:
+                return
+            self.baseline_pixels += image.width * image.height * (DEFAULT_DPI / dpi) ** 2
+            image = crop_page(image, self.crop_region)
+            seconds = time.perf_counter() - started
+            self.stage_timings['rasterize'] = self.stage_timings.get('rasterize', 0.0) + seconds
+            metrics.observe('stage_seconds', seconds, stage='rasterize')
+            self.pixels_rasterized += image.width * image.height
+            metrics.count('rasterized_pixels_total', image.width * image.height)
+            self.pages_per_dpi[dpi] += 1
+            yield image
+
+    # Replaces blank and duplicate pages by SkippedPage markers, so they are
+    # neither preprocessed nor sent to the OCR workers. The earlier page of a
+    # duplicate candidate is rendered again to compare the two pixel by pixel.
+    def _skip_pages(self, pdf_path, dpi, page_indexes, images):
+        def render_page(page_index):
+            image = next(rasterize_pages(pdf_path, [page_index], dpi=dpi))
+            return page_to_gray_array(crop_page(image, self.crop_region))
+
+        classifier = PageClassifier(self.skip_blank_pages, self.reuse_duplicate_pages, render_page)
+        for page_index, image in zip(page_indexes, images):
+            started = time.perf_counter()
+            skipped = classifier.classify(page_index, page_to_gray_array(image))
+            seconds = time.perf_counter() - started
+            self.stage_timings['classify'] = self.stage_timings.get('classify', 0.0) + seconds
+            metrics.observe('stage_seconds', seconds, stage='classify')
+            if skipped is not None:
+                del image
+                yield skipped
+            else:
+                yield image
+
+    # Pixels per page compared with full pages at DEFAULT_DPI. OCR and
+    # rasterization time scale with the pixel count, so the ratio is the
+    # expected speedup of the DPI and crop settings.
+    def resolution_report(self):
+        if not self.pixels_rasterized:
+            return {}
+        pages = sum(self.pages_per_dpi.values())
+        return {
+            'pages_per_dpi': dict(self.pages_per_dpi),
+            'megapixels_per_page': round(self.pixels_rasterized / pages / 1e6, 2),
+            'baseline_megapixels_per_page': round(self.baseline_pixels / pages / 1e6, 2),
+            'estimated_speedup': round(self.baseline_pixels / self.pixels_rasterized, 2),
+        }
+
+    def _collect(self, result):
+        text, timings, quality = result
+        for stage, seconds in timings.items():
+            self.stage_timings[stage] = self.stage_timings.get(stage, 0.0) + seconds
+            metrics.observe('stage_seconds', seconds, stage=stage)
+        self.pages_timed += 1
+        metrics.count('ocr_characters_total', len(text))
+        metrics.count('ocr_passes_total', quality['passes'])
+        if quality['passes'] > 1:
+            metrics.count('ocr_retried_pages_total')
+        return text, quality
+
+    # Milliseconds per page for each preprocessing stage and OCR
+    def timing_report(self):
+        pages = max(1, self.pages_timed)
+        return {stage: round(seconds * 1000 / pages, 2) for stage, seconds in self.stage_timings.items()}
+
+    def recognize_pages(self, images):
+        return list(self.iter_pages(images))
+
+    # Parameters a checkpoint must match to be resumed
+    def checkpoint_params(self):
+        return dict(self.cache_params(), use_text_layer=self.use_text_layer)
+
+    # Everything that changes the OCR output for a given page image
+    def cache_params(self):
+        return {
+            'dpi': self.dpi if self.dpi != 'auto' else f'auto:{AUTO_DPI_GLYPH_PX}',
+            'crop_region': self.crop_region,
+            'skip_blank_pages': self.skip_blank_pages,
+            'reuse_duplicate_pages': self.reuse_duplicate_pages,
+            'block_ocr': self.block_ocr_min_megapixels if self.block_ocr else False,
+            'adaptive_ocr': {
+                'min_confidence': self.adaptive_min_confidence,
+                'retry_dpi': self.adaptive_retry_dpi,
+                'retry_preprocessing': self.retry_preprocess_config,
+            } if self.adaptive_ocr else False,
+            'grayscale': True,
+            'preprocessing': self.preprocess_config,
+            'lang': TESSERACT_LANG,
+            'config': TESSERACT_CONFIG,
+            'backend': self.backend,
+        }
+
+    # Generator: yields the text of every page of a PDF in page order.
+    # Pages with a usable text layer take it as is, pages found in the
+    # checkpoint or the cache are neither rasterized nor recognized again, and
+    # only the remaining image-only pages go through OCR. Newly recognized
+    # pages are added to the checkpoint as they are yielded.
+    def iter_pdf(self, pdf_path, page_count=None, checkpoint=None):
+        if page_count is None:
+            page_count = get_page_count(pdf_path)
+        metrics.count('pdf_bytes_total', os.path.getsize(pdf_path))
+        texts = [None] * page_count
+        # Where each page will come from; a page's source is recorded in
+        # page_sources once the page is yielded
+        sources = [SOURCE_OCR] * page_count
+        self.page_sources = []
+        self.page_passes = [0] * page_count
+        self.page_confidences = [None] * page_count
+
+        if self.use_text_layer:
+            text_layer = extract_text_layer(pdf_path, page_count)
+            for page_index, text in enumerate(text_layer or ()):
+                if has_text_layer(text):
+                    texts[page_index] = text
+                    sources[page_index] = SOURCE_TEXT_LAYER
+
+        # Pages the automatic DPI is judged from; independent of the cache and
+        # checkpoint, so a document always gets the same DPI
+        image_pages = [page_index for page_index, text in enumerate(texts) if text is None]
+
+        if checkpoint is not None:
+            for page_index, text in checkpoint.pages.items():
+                if page_index < page_count and texts[page_index] is None:
+                    texts[page_index] = text
+                    sources[page_index] = SOURCE_CHECKPOINT
+
+        keys = {}
+        if self.cache is not None:
+            document_hash = hash_file(pdf_path)
+            params = self.cache_params()
+            for page_index, text in enumerate(texts):
+                if text is None:
+                    keys[page_index] = key = self.cache.page_key(document_hash, page_index, params)
+                    texts[page_index] = self.cache.get(key)
+                    if texts[page_index] is not None:
+                        sources[page_index] = SOURCE_CACHE
+
+        missing = [page_index for page_index, text in enumerate(texts) if text is None]
+        dpi = self.dpi
+        if dpi == 'auto' and missing:
+            dpi = choose_dpi(pdf_path, image_pages, self.crop_region)
+        self.pages_to_ocr = len(missing)
+        images = self._rasterize(pdf_path, missing, dpi)
+        if self.skip_blank_pages or self.reuse_duplicate_pages:
+            images = self._skip_pages(pdf_path, dpi, missing, images)
+        recognized = self._iter_results(images, pdf_path, missing)
+        ocr_texts = {}  # page index -> text of the OCR'd pages duplicates may refer to
+        for page_index in range(page_count):
+            text, texts[page_index] = texts[page_index], None
+            if text is None:
+                result = next(recognized)
+                if isinstance(result, SkippedPage):
+                    sources[page_index] = result.reason
+                    text = ''
+                    if result.reason == SOURCE_DUPLICATE:
+                        text = ocr_texts[result.original]
+                        self.page_confidences[page_index] = self.page_confidences[result.original]
+                else:
+                    text, quality = result
+                    self.page_passes[page_index] = quality['passes']
+                    self.page_confidences[page_index] = quality['confidence']
+                    if self.reuse_duplicate_pages:
+                        ocr_texts[page_index] = text
+                if page_index in keys:
+                    self.cache.put(keys[page_index], text)
+            if checkpoint is not None and sources[page_index] not in (SOURCE_TEXT_LAYER, SOURCE_CHECKPOINT):
+                checkpoint.add(page_index, text)
+            metrics.count('pages_total', source=sources[page_index])
+            self.page_sources.append(sources[page_index])
+            yield text
+
+    # Number of pages per source among the pages of the last document yielded
+    # so far; pages not reached before a cancel are not counted
+    def source_counts(self):
+        return dict(collections.Counter(self.page_sources))
+
+    # Passes and confidence of the pages recognized in the last document;
+    # empty unless adaptive OCR is on
+    def quality_report(self):
+        recognized = [passes for passes in self.page_passes if passes]
+        if not self.adaptive_ocr or not recognized:
+            return {}
+        confidences = [confidence for confidence in self.page_confidences if confidence is not None]
+        return {
+            'pages_recognized': len(recognized),
+            'passes': sum(recognized),
+            'retried_pages': sum(1 for passes in recognized if passes > 1),
+            'retry_dpi': self.adaptive_retry_dpi,
+            'mean_confidence': round(sum(confidences) / len(confidences), 1) if confidences else None,
+            # 1-based, still below the threshold after the retry
+            'low_confidence_pages': [page_index + 1 for page_index, confidence in enumerate(self.page_confidences)
+                                     if confidence is not None and confidence < self.adaptive_min_confidence],
+        }
+
+    # Adds the timings and pixel counts of another engine, e.g. one used for
+    # a single file of a batch run
+    def add_stats(self, other):
+        for stage, seconds in other.stage_timings.items():
+            self.stage_timings[stage] = self.stage_timings.get(stage, 0.0) + seconds
+        self.pages_timed += other.pages_timed
+        self.pixels_rasterized += other.pixels_rasterized
+        self.baseline_pixels += other.baseline_pixels
+        self.pages_per_dpi.update(other.pages_per_dpi)
+
+    def recognize_pdf(self, pdf_path):
+        return list(self.iter_pdf(pdf_path))
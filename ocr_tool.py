@@ -1,42 +1,77 @@
 import sys
 import os
 import json
-import appdirs
-import re
-import numpy as np
-import cv2
+import time
+import queue
+import functools
+import collections
+import subprocess
+
+# The OCR, translation and export stacks (cv2, numpy, pytesseract, pdf2image,
+# deepl, docx) are imported on first use, so the window shows up without
+# paying for them. startup-check verifies this against a time budget.
+STARTUP_BUDGET_SECONDS = 2.0
+HEAVY_MODULES = ('cv2', 'numpy', 'pytesseract', 'pdf2image', 'deepl', 'docx')
+
+
+# Starts the GUI in a child process that quits as soon as the window is shown,
+# and fails if that took longer than the budget or pulled in a heavy module
+def check_startup_time(budget=STARTUP_BUDGET_SECONDS):
+    started = time.perf_counter()
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--exit-after-show"])
+    elapsed = time.perf_counter() - started
+    loaded_heavy_modules = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    print(f"cold start: {elapsed:.2f}s (budget {budget:.2f}s)")
+    if loaded_heavy_modules:
+        print(f"loaded before first job: {', '.join(loaded_heavy_modules)}")
+    return 0 if elapsed <= budget and not loaded_heavy_modules else 1
+
+# The headless commands are dispatched before Qt is imported. `batch` runs
+# batch.py as the main module, so the OCR worker processes it spawns (which
+# import the parent's main module again) do not load Qt either.
+if __name__ == "__main__" and sys.argv[1:2] == ["batch"]:
+    import runpy
+    del sys.argv[1]
+    runpy.run_module("batch", run_name="__main__", alter_sys=True)
+    sys.exit()
+if __name__ == "__main__" and sys.argv[1:2] == ["startup-check"]:
+    sys.exit(check_startup_time())
+
 from languages import get_system_language, get_language_dict, map_system_language_to_application_language
-from PyQt5.QtWidgets import QComboBox, QInputDialog, QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, QLabel, QFileDialog, QMenuBar, QAction, QMessageBox, QSplitter, QSizePolicy
+from PyQt5.QtWidgets import QComboBox, QInputDialog, QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, QLabel, QFileDialog, QMenuBar, QAction, QMessageBox, QSplitter, QSizePolicy, QListWidget, QListWidgetItem, QToolButton
 from PyQt5.QtGui import QIcon, QPixmap
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-from pdf2image import convert_from_path
-from docx import Document
-import pytesseract
-import deepl
-
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, QTimer, pyqtSignal, Qt
+from boilerplate import RepeatedLines
+from metrics import metrics
+from job_queue import QUEUED, RUNNING, DONE, CANCELLED, FAILED, JobQueue
+from settings import get_api_key_file_path, get_app_dir, load_settings, read_api_key, save_settings
+from text_processing import normalize_page
 
-# set file path to store personal DeepL api key
-def get_api_key_file_path():
-    app_name = "OCR-Tool"
-    app_author = "MedMate"  
-    app_dir = appdirs.user_data_dir(app_name, app_author)
-    os.makedirs(app_dir, exist_ok=True)
-    return os.path.join(app_dir, "api_key.txt")
 
 # Function to perform OCR on an image
 def ocr_on_image(image):
+    import pytesseract
     text = pytesseract.image_to_string(image)
     return text
 
 # Function to convert PDF to text
-def pdf_to_text(pdf_path):
-    images = convert_from_path(pdf_path)
-    all_text = []
-    for image in images:
-        text = ocr_on_image(image)
-        all_text.append(text)
+def pdf_to_text(pdf_path, workers=0, cache=None, backend='auto', preprocess_config=None, use_text_layer=True):
+    from ocr_engine import OCREngine
+    all_text = OCREngine(workers, cache, backend, preprocess_config, use_text_layer).recognize_pdf(pdf_path)
     return '\n'.join(all_text)
 
+# Function to save text to a DOCX file, one paragraph per text block
+def save_to_doc(text, doc_path):
+    from exporters import DocxExporter
+    with DocxExporter(doc_path) as exporter:
+        exporter.add_page(text)
+
+# Error messages are shown on a single status line
+def first_line(message):
+    lines = str(message).strip().splitlines()
+    return lines[0] if lines else ''
+
 class AspectRatioPixmapLabel(QLabel):
     def __init__(self, parent=None):
         super(AspectRatioPixmapLabel, self).__init__(parent)
@@ -57,38 +92,216 @@ class AspectRatioPixmapLabel(QLabel):
 
 class OCRThread(QThread):
     ocr_complete = pyqtSignal(str)
-
-    def __init__(self, pdf_path):
+    page_complete = pyqtSignal(int, str)  # page index, page text
+    progress = pyqtSignal(int, int)  # pages done, total pages
+    stage_timings = pyqtSignal(dict)  # milliseconds per page for each stage
+    page_sources = pyqtSignal(dict)  # pages per source: text_layer, checkpoint, cache, ocr
+    ocr_cancelled = pyqtSignal(int, int)  # pages done, total pages
+    ocr_failed = pyqtSignal(str)
+    resolution = pyqtSignal(dict)  # DPI used and pixel savings, see OCREngine.resolution_report
+    quality = pyqtSignal(dict)  # passes and confidence with adaptive OCR, see OCREngine.quality_report
+
+    # `pool` is the OCR worker pool shared by all running documents
+    def __init__(self, pdf_path, settings, pool=None):
         super().__init__()
         self.pdf_path = pdf_path
+        self.settings = settings
+        self.pool = pool
 
     def run(self):
-        images = convert_from_path(self.pdf_path)
+        started = time.perf_counter()
+        try:
+            status = self.recognize()
+        except Exception as e:
+            metrics.count('documents_total', status='failed')
+            self.ocr_failed.emit(str(e))
+            return
+        metrics.count('documents_total', status=status)
+        metrics.observe('document_seconds', time.perf_counter() - started)
+
+    def recognize(self):
+        # Imported here so the GUI thread never waits for cv2/numpy
+        from checkpoints import JobCheckpoint
+        from ocr_engine import engine_from_settings, get_page_count
+        engine = engine_from_settings(self.settings, pool=self.pool)
+        page_count = get_page_count(self.pdf_path)
+        self.progress.emit(0, page_count)
+        # Pages recognized by an earlier, cancelled run of this file are reused
+        checkpoint = JobCheckpoint.for_document(self.pdf_path, engine.checkpoint_params())
+
+        # Pages are rasterized in small chunks and OCR runs in the engine's
+        # worker processes; cached pages skip both. This thread only collects
+        # and forwards the text.
         all_text = []
-        for image in images:
-            open_cv_image = np.array(image)
-            open_cv_image = cv2.cvtColor(open_cv_image, cv2.COLOR_RGB2BGR)
-            preprocessed_image = self.preprocess_image(open_cv_image)
-            text = pytesseract.image_to_string(preprocessed_image)
+        pages = engine.iter_pdf(self.pdf_path, page_count, checkpoint)
+        page_started = time.perf_counter()
+        for page_index, text in enumerate(pages):
+            # Time from one page to the next as seen by the GUI
+            metrics.observe('page_seconds', time.perf_counter() - page_started)
             all_text.append(text)
+            self.page_complete.emit(page_index, text)
+            self.progress.emit(page_index + 1, page_count)
+            if self.isInterruptionRequested():
+                # Stops the workers; finished pages stay in the checkpoint
+                pages.close()
+                self.page_sources.emit(engine.source_counts())
+                self.ocr_cancelled.emit(page_index + 1, page_count)
+                return 'cancelled'
+            page_started = time.perf_counter()
+        checkpoint.complete()
         final_text = '\n'.join(all_text)
+        self.stage_timings.emit(engine.timing_report())
+        self.resolution.emit(engine.resolution_report())
+        self.quality.emit(engine.quality_report())
+        self.page_sources.emit(engine.source_counts())
         self.ocr_complete.emit(final_text)
-        
+        return 'done'
+
     @staticmethod
     def preprocess_image(image):
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        from ocr_engine import preprocess_image
+        return preprocess_image(image)
 
-        # Apply a basic threshold
-        _, thresh = cv2.threshold(gray, 100 , 255, cv2.THRESH_BINARY)
-        
-        return thresh
+
+class TranslationThread(QThread):
+    page_translated = pyqtSignal(int, str)  # page index, translated text
+    translation_complete = pyqtSignal(str)
+    translation_failed = pyqtSignal(str)
+
+    # With `repeated_lines` (a boilerplate.RepeatedLines), headers and footers
+    # repeated across the document's pages are translated once
+    def __init__(self, engine, target_lang, repeated_lines=None):
+        super().__init__()
+        self.engine = engine
+        self.target_lang = target_lang
+        self.repeated_lines = repeated_lines
+        self.pages = queue.Queue()
+        self.cancelled = False
+
+    # Called for every recognized page while OCR is still running
+    def add_page(self, text):
+        self.pages.put(text)
+
+    # No more pages will follow
+    def finish(self):
+        self.pages.put(None)
+
+    # Stops after the request in flight; translation_complete is not emitted
+    def cancel(self):
+        self.cancelled = True
+        self.pages.put(None)
+
+    def run(self):
+        translated_pages = []
+        done = False
+        # Repeated lines are only recognized once they were seen on a few
+        # pages, so the first pages are held back until then
+        min_pages = self.repeated_lines.min_pages if self.repeated_lines is not None else 1
+        try:
+            while not done and not self.cancelled:
+                # Wait for the next page, then take everything else already
+                # queued so those pages share DeepL requests
+                batch = [self.pages.get()]
+                while not translated_pages and len(batch) < min_pages and batch[-1] is not None:
+                    batch.append(self.pages.get())
+                while True:
+                    try:
+                        batch.append(self.pages.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    done = True
+                    batch = batch[:batch.index(None)]
+                for text in self.engine.translate_pages(batch, self.target_lang, self.repeated_lines):
+                    self.page_translated.emit(len(translated_pages), text)
+                    translated_pages.append(text)
+        except Exception as e:
+            self.translation_failed.emit(str(e))
+            return
+        if self.cancelled:
+            return
+        self.translation_complete.emit('\n'.join(translated_pages))
+
+
+# Writes an export file (DOCX, text or JSON lines) page by page while the
+# document is still being processed, so only the final save is left at the end
+class ExportThread(QThread):
+    export_complete = pyqtSignal(str)  # path of the written file
+    export_failed = pyqtSignal(str)
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.pages = queue.Queue()
+        self.cancelled = False
+
+    def add_page(self, text):
+        self.pages.put(text)
+
+    # No more pages will follow
+    def finish(self):
+        self.pages.put(None)
+
+    # Discards the file instead of writing it
+    def cancel(self):
+        self.cancelled = True
+        self.pages.put(None)
+
+    def run(self):
+        from exporters import create_exporter
+        exporter = None
+        try:
+            exporter = create_exporter(self.path)
+            for text in iter(self.pages.get, None):
+                if self.cancelled:
+                    break
+                exporter.add_page(text)
+            if self.cancelled:
+                exporter.abort()
+                return
+            exporter.close()
+        except Exception as e:
+            if exporter is not None:
+                exporter.abort()
+            self.export_failed.emit(str(e))
+            return
+        self.export_complete.emit(self.path)
+
+
+# The threads working on one document
+JobThreads = collections.namedtuple('JobThreads', 'ocr translation original_export translated_export')
+
+
+class PageCountSignals(QObject):
+    page_counted = pyqtSignal(int, int)  # job id, page count
+    count_failed = pyqtSignal(int, str)  # job id, error
+
+
+# Counts the pages of newly queued documents on the global thread pool; the
+# scheduler needs the counts to start small documents first
+class PageCountJob(QRunnable):
+    def __init__(self, jobs):
+        super().__init__()
+        self.jobs = [(job.id, job.pdf_path) for job in jobs]
+        self.signals = PageCountSignals()
+
+    def run(self):
+        from ocr_engine import get_page_count
+        for job_id, pdf_path in self.jobs:
+            try:
+                page_count = get_page_count(pdf_path)
+            except Exception as e:
+                self.signals.count_failed.emit(job_id, str(e))
+                continue
+            self.signals.page_counted.emit(job_id, page_count)
 
     
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.api_key = self.load_api_key()
+        self.settings = load_settings()
+        self.translation_memory = None  # opened with the first translation job
 
         # Check if the language.txt file exists, if not, create with default values
         if not os.path.exists(self.get_language_file_path()):
@@ -113,6 +326,7 @@ class MainWindow(QWidget):
     def init_ui(self):
         self.setWindowTitle("PDF to OCR by @MedMate")
         self.setMinimumSize(900, 600)
+        self.setAcceptDrops(True)
 
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
@@ -138,46 +352,369 @@ class MainWindow(QWidget):
 
 
     def process_pdf(self):
-        if self.ocr_thread and self.ocr_thread.isRunning():
-            # If the OCR thread is already running, do not open the file dialog again
-            return        
-        pdf_path, _ = QFileDialog.getOpenFileName(self, "Open File", "/", "PDF files (*.pdf)")
-        if pdf_path:
-            self.status_label.setText("Translating... Please wait.")
-            self.ocr_thread = OCRThread(pdf_path)
-            self.ocr_thread.ocr_complete.connect(self.on_ocr_complete)
-            self.ocr_thread.start()
-
-    def on_ocr_complete(self, text):
-        cleaned_text = self.clean_text(text)
-        self.text_display.setPlainText(cleaned_text)
-        self.status_label.setText("Translation completed.")
-
-        # Save the original text to a DOC file and open it
-        original_doc_path = "original_text.docx"
-        self.save_to_doc(cleaned_text, original_doc_path)
-        self.open_file(original_doc_path)
-
-        # Translate the text and save to another DOC file
-        translated_text = self.translate_text(cleaned_text)
-        translated_doc_path = "translated_text.docx"
-        self.edit_field.setPlainText(translated_text)
-        self.save_to_doc(translated_text, translated_doc_path)
-        self.open_file(translated_doc_path)
-
-    def clean_text(self, text):
-        # Keep alphabetic characters, numbers, and specific punctuation marks
-        text = re.sub(r"[^a-zA-Z0-9-/.,;:'\s]", '', text)
-        return text
-
-    def translate_text(self, text):
-        translator = deepl.Translator(self.api_key)
-        try:
-            result = translator.translate_text(text, target_lang=self.language)  # Use the selected language code
-            return result.text
-        except Exception as e:
-            QMessageBox.critical(self, "Translation Error", str(e))
-            return ""
+        pdf_paths, _ = QFileDialog.getOpenFileNames(self, "Open Files", "/", "PDF files (*.pdf)")
+        self.enqueue_pdfs(pdf_paths)
+
+    # Documents can be added at any time; they start once their page count is
+    # known and the scheduler has room for them. A document that is already
+    # queued or running is not added again: both jobs would write the same
+    # export and checkpoint files, and the first to finish would delete the
+    # checkpoint of the other.
+    def enqueue_pdfs(self, pdf_paths):
+        jobs = []
+        already_queued = []
+        for pdf_path in pdf_paths:
+            if self.job_queue.unfinished_job(pdf_path):
+                already_queued.append(os.path.basename(pdf_path))
+            else:
+                jobs.append(self.job_queue.add(pdf_path))
+        if jobs:
+            for job in jobs:
+                # Later settings changes (e.g. the DPI) only apply to later jobs
+                job.settings = dict(self.settings)
+                item = QListWidgetItem()
+                item.setData(Qt.UserRole, job.id)
+                self.job_list.addItem(item)
+                self.update_job_item(job)
+            if self.job_list.currentItem() is None:
+                self.job_list.setCurrentRow(self.job_list.count() - len(jobs))
+            counter = PageCountJob(jobs)
+            counter.signals.page_counted.connect(self.on_page_counted)
+            counter.signals.count_failed.connect(self.on_count_failed)
+            QThreadPool.globalInstance().start(counter)
+        if already_queued:
+            self.status_label.setText(f"Already queued: {', '.join(already_queued)}")
+
+    def on_page_counted(self, job_id, page_count):
+        job = self.job_queue.get(job_id)
+        job.page_count = page_count
+        self.update_job_item(job)
+        self.schedule()
+
+    def on_count_failed(self, job_id, message):
+        job = self.job_queue.get(job_id)
+        job.status = FAILED
+        job.message = first_line(message)
+        self.update_job_item(job)
+
+    # Starts queued documents, smallest first, as far as the CPU and memory
+    # limits allow. All of them share one pool of OCR worker processes.
+    def schedule(self):
+        # The finished signals of the threads closeEvent waited for (and late
+        # page counts) arrive after it; nothing may start on the closed pool
+        if self.closing:
+            return
+        from ocr_engine import create_worker_pool, engine_from_settings, resolve_worker_count
+        workers = resolve_worker_count(self.settings['ocr_workers'])
+        if self.ocr_pool is not None and self.ocr_pool_workers != workers and not self.is_busy():
+            # The worker count was changed in the settings
+            self.ocr_pool.shutdown()
+            self.ocr_pool = None
+        if self.ocr_pool is None:
+            self.ocr_pool = create_worker_pool(workers)
+            self.ocr_pool_workers = workers
+        # Estimated from each job's own settings, as its OCRThread will run it
+        def job_memory(job):
+            return engine_from_settings(job.settings, self.ocr_pool_workers, self.ocr_pool).memory_estimate()
+        for job in self.job_queue.next_jobs(job_memory):
+            self.start_job(job)
+
+    def start_job(self, job):
+        # Pages are translated while later pages are still being recognized
+        repeated_lines = RepeatedLines() if job.settings['strip_repeated_lines'] else None
+        translation_thread = TranslationThread(self.create_translation_engine(), self.language, repeated_lines)
+        translation_thread.page_translated.connect(functools.partial(self.on_page_translated, job))
+        translation_thread.translation_complete.connect(functools.partial(self.on_translation_complete, job))
+        translation_thread.translation_failed.connect(functools.partial(self.on_translation_failed, job))
+        translation_thread.finished.connect(functools.partial(self.on_job_finished, job))
+
+        ocr_thread = OCRThread(job.pdf_path, job.settings, self.ocr_pool)
+        ocr_thread.page_complete.connect(functools.partial(self.on_page_complete, job))
+        ocr_thread.progress.connect(functools.partial(self.on_ocr_progress, job))
+        ocr_thread.stage_timings.connect(self.on_stage_timings)
+        ocr_thread.resolution.connect(self.on_resolution)
+        ocr_thread.quality.connect(self.on_quality)
+        ocr_thread.page_sources.connect(functools.partial(self.on_page_sources, job))
+        ocr_thread.ocr_complete.connect(functools.partial(self.on_ocr_complete, job))
+        ocr_thread.ocr_cancelled.connect(functools.partial(self.on_ocr_cancelled, job))
+        ocr_thread.ocr_failed.connect(functools.partial(self.on_ocr_failed, job))
+        ocr_thread.finished.connect(functools.partial(self.on_job_finished, job))
+
+        # Both files are written as the pages come in
+        export_threads = []
+        for suffix in ("original_text", "translated_text"):
+            export_thread = ExportThread(self.get_export_path(job, suffix))
+            export_thread.export_complete.connect(self.open_file)
+            export_thread.export_failed.connect(self.on_export_failed)
+            export_thread.finished.connect(functools.partial(self.on_job_finished, job))
+            export_threads.append(export_thread)
+
+        threads = self.job_threads[job.id] = JobThreads(ocr_thread, translation_thread, *export_threads)
+        for thread in threads:
+            thread.start()
+        self.update_job_item(job)
+
+    def is_busy(self):
+        return any(thread.isRunning() for threads in self.job_threads.values() for thread in threads)
+
+    def selected_job(self):
+        item = self.job_list.currentItem()
+        return self.job_queue.get(item.data(Qt.UserRole)) if item is not None else None
+
+    def is_selected(self, job):
+        return self.selected_job() is job
+
+    def on_job_selected(self):
+        # The text views always show the selected document
+        job = self.selected_job()
+        self.text_display.setPlainText('\n'.join(job.texts) if job else '')
+        self.edit_field.setPlainText('\n'.join(job.translated_texts) if job else '')
+        self.cancel_button.setEnabled(job is not None and not job.is_finished())
+        self.update_progress_label()
+
+    # Cancels the selected document; a running one keeps its checkpoint
+    def cancel_job(self):
+        job = self.selected_job()
+        if job is None or job.is_finished():
+            return
+        if job.status == QUEUED:
+            job.status = CANCELLED
+        else:
+            self.stop_job_threads(self.job_threads[job.id])
+            self.status_label.setText("Cancelling...")
+        self.update_job_item(job)
+
+    def stop_job_threads(self, threads):
+        threads.ocr.requestInterruption()
+        threads.translation.cancel()
+        threads.original_export.cancel()
+        threads.translated_export.cancel()
+
+    def on_ocr_cancelled(self, job, pages_done, page_count):
+        job.status = CANCELLED
+        job.pages_recognized = pages_done
+        self.update_job_item(job)
+
+    def on_ocr_failed(self, job, message):
+        job.status = FAILED
+        job.message = first_line(message)
+        threads = self.job_threads[job.id]
+        threads.translation.cancel()
+        threads.original_export.cancel()
+        threads.translated_export.cancel()
+        self.update_job_item(job)
+
+    def on_job_finished(self, job):
+        threads = self.job_threads.get(job.id, ())
+        if any(thread.isRunning() for thread in threads):
+            return
+        for thread in threads:
+            thread.wait()  # returns at once; the thread object must outlive its finish
+        self.job_threads.pop(job.id, None)
+        if job.status == RUNNING:
+            # Cancelled after the last page was already recognized
+            job.status = CANCELLED
+        self.update_job_item(job)
+        if self.settings['metrics_file']:
+            # Picked up by the fleet monitoring after every document
+            try:
+                metrics.export(self.settings['metrics_file'])
+            except OSError:
+                pass
+        self.schedule()
+
+    # Recognized pages are checkpointed, so closing mid-job loses nothing
+    def closeEvent(self, event):
+        self.closing = True
+        for job in self.job_queue.with_status(QUEUED):
+            job.status = CANCELLED
+        for threads in self.job_threads.values():
+            self.stop_job_threads(threads)
+        for threads in list(self.job_threads.values()):
+            for thread in threads:
+                thread.wait()
+        if self.ocr_pool is not None:
+            self.ocr_pool.shutdown(cancel_futures=True)
+            self.ocr_pool = None
+        event.accept()
+
+    def toggle_diagnostics(self, visible):
+        self.diagnostics_button.setArrowType(Qt.DownArrow if visible else Qt.RightArrow)
+        self.diagnostics_panel.setVisible(visible)
+        if visible:
+            self.refresh_diagnostics()
+            self.diagnostics_timer.start()
+        else:
+            self.diagnostics_timer.stop()
+
+    def refresh_diagnostics(self):
+        snapshot = metrics.snapshot()
+        lines = [f"{'timer':52} {'count':>7} {'mean ms':>9} {'max ms':>9} {'total s':>9}"]
+        for name, timer in snapshot['timers'].items():
+            lines.append(f"{name:52} {timer['count']:>7} {timer['mean_ms']:>9} {timer['max_ms']:>9} "
+                         f"{timer['total_seconds']:>9}")
+        lines += ["", f"{'counter':52} {'value':>7}"]
+        lines += [f"{name:52} {value:>7}" for name, value in snapshot['counters'].items()]
+        self.diagnostics_view.setPlainText("\n".join(lines))
+
+    def export_metrics(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Metrics", "ocr_tool_metrics.json",
+                                              "JSON (*.json);;Prometheus text (*.prom)")
+        if path:
+            try:
+                metrics.export(path)
+            except OSError as e:
+                QMessageBox.critical(self, "Export Error", str(e))
+
+    # PDFs dropped on the window are queued
+    def dragEnterEvent(self, event):
+        if any(url.toLocalFile().lower().endswith(".pdf") for url in event.mimeData().urls()):
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        self.enqueue_pdfs([url.toLocalFile() for url in event.mimeData().urls()
+                           if url.toLocalFile().lower().endswith(".pdf")])
+
+    def on_page_complete(self, job, page_index, text):
+        # Show each page as soon as it is recognized and queue it for translation
+        threads = self.job_threads.get(job.id)
+        if threads is None:
+            # Delivered after the job's threads were stopped and released
+            return
+        cleaned_text = normalize_page(text)
+        job.texts.append(cleaned_text)
+        if self.is_selected(job):
+            self.text_display.append(cleaned_text)
+        threads.translation.add_page(cleaned_text)
+        threads.original_export.add_page(cleaned_text)
+
+    def on_ocr_progress(self, job, pages_done, page_count):
+        job.page_count = page_count
+        job.pages_recognized = pages_done
+        self.update_job_item(job)
+
+    def on_stage_timings(self, timings):
+        # Hovering the status line shows where the OCR time went
+        self.stage_report = "\n".join(f"{stage}: {ms} ms/page" for stage, ms in timings.items())
+        self.status_label.setToolTip(self.stage_report)
+
+    def on_resolution(self, report):
+        if not report:
+            return
+        dpis = ", ".join(str(dpi) for dpi in report['pages_per_dpi'])
+        self.stage_report += (f"\nDPI: {dpis}, {report['megapixels_per_page']} megapixels/page "
+                              f"(x{report['estimated_speedup']} vs. full pages at 200 DPI)")
+        self.status_label.setToolTip(self.stage_report)
+
+    def on_quality(self, report):
+        if not report:
+            return
+        self.stage_report += (f"\nOCR confidence: {report['mean_confidence']}, "
+                              f"{report['retried_pages']} of {report['pages_recognized']} pages re-read "
+                              f"at {report['retry_dpi']} DPI")
+        if report['low_confidence_pages']:
+            pages = ", ".join(str(page) for page in report['low_confidence_pages'])
+            self.stage_report += f"\nStill low confidence: page {pages}"
+        self.status_label.setToolTip(self.stage_report)
+
+    def on_page_sources(self, job, counts):
+        labels = {'text_layer': "from text layer", 'checkpoint': "resumed", 'cache': "cached", 'ocr': "OCR",
+                  'blank': "blank skipped", 'duplicate': "duplicates reused"}
+        job.source_summary = ", ".join(f"{count} {labels.get(source, source)}" for source, count in counts.items())
+        self.update_job_item(job)
+
+    def on_page_translated(self, job, page_index, text):
+        threads = self.job_threads.get(job.id)
+        if threads is None:
+            return
+        job.translated_texts.append(text)
+        threads.translated_export.add_page(text)
+        if self.is_selected(job):
+            self.edit_field.append(text)
+        job.pages_translated = page_index + 1
+        self.update_job_item(job)
+
+    # One line per document in the queue
+    def update_job_item(self, job):
+        if job.status == QUEUED:
+            status = "queued" + (f" ({job.page_count} pages)" if job.page_count is not None else "")
+        elif job.status == RUNNING:
+            status = (f"recognized {job.pages_recognized}/{job.page_count}, "
+                      f"translated {job.pages_translated}/{job.page_count}")
+        elif job.status == CANCELLED:
+            status = f"cancelled after {job.pages_recognized}/{job.page_count or 0} pages"
+        elif job.status == FAILED:
+            status = f"failed: {job.message}"
+        else:
+            status = "done"
+        for row in range(self.job_list.count()):
+            item = self.job_list.item(row)
+            if item.data(Qt.UserRole) == job.id:
+                item.setText(f"{job.name}: {status}")
+        if self.is_selected(job):
+            self.cancel_button.setEnabled(not job.is_finished())
+            self.update_progress_label()
+
+    def update_progress_label(self):
+        job = self.selected_job()
+        sources = f" ({job.source_summary})" if job and job.source_summary else ""
+        if job is None:
+            text = "Ready"
+        elif job.status == QUEUED:
+            text = "Queued"
+        elif job.status == DONE:
+            text = "Translation completed." + sources
+        elif job.status == CANCELLED:
+            text = (f"Cancelled after {job.pages_recognized}/{job.page_count or 0} pages. "
+                    "Open the file again to resume.")
+        elif job.status == FAILED:
+            text = f"Failed: {job.message}"
+        else:
+            text = (f"Recognized {job.pages_recognized}/{job.page_count} pages, "
+                    f"translated {job.pages_translated}/{job.page_count}") + sources
+        self.status_label.setText(text)
+
+    def on_ocr_complete(self, job, text):
+        # The page texts are already on screen and in the export, so only the
+        # remaining work is finished here; the export opens once written
+        threads = self.job_threads[job.id]
+        threads.translation.finish()
+        threads.original_export.finish()
+
+    def on_translation_complete(self, job, translated_text):
+        job.status = DONE
+        self.update_job_item(job)
+        self.job_threads[job.id].translated_export.finish()
+
+    # Exports are named after the document, so queued documents do not
+    # overwrite each other's files. Documents of the same name from other
+    # folders are numbered in the order their folders were first queued.
+    def get_export_path(self, job, suffix):
+        name = os.path.splitext(job.name)[0]
+        folders = list(dict.fromkeys(os.path.dirname(os.path.abspath(other.pdf_path))
+                                     for other in self.job_queue.jobs if other.name == job.name))
+        index = folders.index(os.path.dirname(os.path.abspath(job.pdf_path)))
+        if index:
+            name += f"_{index + 1}"
+        return f"{name}_{suffix}.{job.settings['export_format']}"
+
+    def on_export_failed(self, message):
+        QMessageBox.critical(self, "Export Error", message)
+
+    def on_translation_failed(self, job, message):
+        job.status = FAILED
+        job.message = first_line(message)
+        self.job_threads[job.id].translated_export.cancel()
+        self.update_job_item(job)
+        QMessageBox.critical(self, "Translation Error", f"{job.name}: {message}")
+
+    def create_translation_engine(self):
+        from translation import TranslationEngine, TranslationMemory
+        if self.translation_memory is None:
+            self.translation_memory = TranslationMemory()
+        # Paragraphs already in the translation memory are not sent to DeepL
+        return TranslationEngine(self.api_key, self.translation_memory, self.settings['deepl_server_url'],
+                                 self.settings['translation_concurrency'])
 
 
     def setup_menu(self):
@@ -201,6 +738,14 @@ class MainWindow(QWidget):
         change_api_action = QAction('DeepL API Key', self)
         change_api_action.triggered.connect(self.change_api_key)
         settings_menu.addAction(change_api_action)
+
+        ocr_workers_action = QAction('OCR Workers', self)
+        ocr_workers_action.triggered.connect(self.change_ocr_workers)
+        settings_menu.addAction(ocr_workers_action)
+
+        ocr_dpi_action = QAction('OCR Resolution', self)
+        ocr_dpi_action.triggered.connect(self.change_ocr_dpi)
+        settings_menu.addAction(ocr_dpi_action)
         
         about_action = QAction('About', self)
         about_action.triggered.connect(self.show_about_dialog)  # Connect to the about dialog
@@ -257,12 +802,7 @@ class MainWindow(QWidget):
         QMessageBox.about(self, "Info", "PDF to OCR Application including translation\n\nContact\ndominik.pytlik@gmail.com\n\nSwitzerland\nDecember 2023")
 
     def load_api_key(self):
-        api_key_file_path = get_api_key_file_path()
-        try:
-            with open(api_key_file_path, "r") as file:
-                return file.read().strip()
-        except FileNotFoundError:
-            return ""
+        return read_api_key()
 
     def change_api_key(self):
         new_key, ok = QInputDialog.getText(self, 'Change API Key', 
@@ -276,6 +816,27 @@ class MainWindow(QWidget):
         with open(api_key_file_path, "w") as file:
             file.write(key)
 
+    def change_ocr_workers(self):
+        # 0 keeps the default of one OCR process per CPU core
+        workers, ok = QInputDialog.getInt(self, 'OCR Workers',
+                                          'Parallel OCR processes (0 = all cores): ',
+                                          self.settings['ocr_workers'], 0, 256)
+        if ok:
+            self.settings['ocr_workers'] = workers
+            save_settings(self.settings)
+
+    def change_ocr_dpi(self):
+        # "auto" picks the DPI per document from the size of its text
+        choices = ['auto', '150', '200', '300']
+        current = str(self.settings['dpi'])
+        if current not in choices:
+            choices.append(current)
+        dpi, ok = QInputDialog.getItem(self, 'OCR Resolution', 'DPI for new documents: ', choices,
+                                       choices.index(current), True)
+        if ok and (dpi == 'auto' or dpi.isdigit() and 50 <= int(dpi) <= 600):
+            self.settings['dpi'] = dpi if dpi == 'auto' else int(dpi)
+            save_settings(self.settings)
+
             
     def setup_widgets(self):
 
@@ -296,6 +857,7 @@ class MainWindow(QWidget):
 
         # Add horizontal splitters to the main vertical splitter
         main_splitter.addWidget(top_horizontal_splitter)
+        main_splitter.addWidget(self.job_list)
         main_splitter.addWidget(bottom_horizontal_splitter)
 
         # Connect the top and bottom splitter to move in sync
@@ -305,10 +867,18 @@ class MainWindow(QWidget):
         # Adding widgets to the layout
         self.layout.addWidget(main_splitter)              
         self.layout.addWidget(self.status_label)
+        self.layout.addWidget(self.diagnostics_button)
+        self.layout.addWidget(self.diagnostics_panel)
+        self.layout.addWidget(self.cancel_button)
         self.layout.addWidget(self.close_button)
 
-        # Set up the OCR thread
-        self.ocr_thread = None
+        # Queued documents and the OCR and translation threads of the running ones
+        self.job_queue = JobQueue(self.settings['max_parallel_jobs'],
+                                  self.settings['job_memory_limit_mb'] * 1024 * 1024)
+        self.job_threads = {}  # job id -> JobThreads
+        self.ocr_pool = None  # created with the first job
+        self.ocr_pool_workers = 0
+        self.closing = False  # no documents are started once the window closes
 
     def sync_splitter(self, splitter_to_sync):
         def syncer(position, index):
@@ -335,6 +905,16 @@ class MainWindow(QWidget):
         self.process_button = QPushButton("Translate PDF")
         self.process_button.setStyleSheet(self.get_button_style("#75A1BF"))
         self.process_button.clicked.connect(self.process_pdf)
+
+        # Queued documents with their status; the selected one is shown below
+        self.job_list = QListWidget()
+        self.job_list.currentItemChanged.connect(self.on_job_selected)
+
+        # 'Cancel' Button for the selected document
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setStyleSheet(self.get_button_style("#75A1BF"))
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_job)
         
         # 'Close' Button
         self.close_button = QPushButton("Exit")
@@ -345,19 +925,37 @@ class MainWindow(QWidget):
         self.status_label = QLabel("Ready")
         self.status_label.setAlignment(Qt.AlignCenter)
         self.status_label.setStyleSheet("font-size: 16px; color: #AEC6CF;")        
-
-    def save_to_doc(self, text, doc_path):
-        doc = Document()
-        doc.add_paragraph(text)
-        doc.save(doc_path)
+        self.stage_report = ""
+
+        # Collapsible diagnostics panel with the live metrics
+        self.diagnostics_button = QToolButton()
+        self.diagnostics_button.setText("Diagnostics")
+        self.diagnostics_button.setCheckable(True)
+        self.diagnostics_button.setToolButtonStyle(Qt.ToolButtonTextBesideIcon)
+        self.diagnostics_button.setArrowType(Qt.RightArrow)
+        self.diagnostics_button.toggled.connect(self.toggle_diagnostics)
+        self.diagnostics_view = QTextEdit()
+        self.diagnostics_view.setReadOnly(True)
+        self.diagnostics_view.setStyleSheet("font-family: monospace; font-size: 12px;")
+        export_metrics_button = QPushButton("Export Metrics...")
+        export_metrics_button.clicked.connect(self.export_metrics)
+        self.diagnostics_panel = QWidget()
+        diagnostics_layout = QVBoxLayout(self.diagnostics_panel)
+        diagnostics_layout.setContentsMargins(0, 0, 0, 0)
+        diagnostics_layout.addWidget(self.diagnostics_view)
+        diagnostics_layout.addWidget(export_metrics_button)
+        self.diagnostics_panel.setVisible(False)
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setInterval(1000)
+        self.diagnostics_timer.timeout.connect(self.refresh_diagnostics)
 
     def open_file(self, file_path):
         if sys.platform == "win32":
             os.startfile(file_path)
         elif sys.platform == "darwin":  # macOS
-            os.system(f"open {file_path}")
+            subprocess.run(["open", file_path])
         else:  # linux variants
-            os.system(f"xdg-open {file_path}")                
+            subprocess.run(["xdg-open", file_path])
 
     def get_full_language_name(self, language_code):
         for name, code in self.language_dict.items():
@@ -368,11 +966,7 @@ class MainWindow(QWidget):
     
     # set file path to store target language preference
     def get_language_file_path(self):
-        app_name = "OCR-Tool"
-        app_author = "MedMate"  
-        app_dir = appdirs.user_data_dir(app_name, app_author)
-        os.makedirs(app_dir, exist_ok=True)
-        return os.path.join(app_dir, "language.txt")
+        return os.path.join(get_app_dir(), "language.txt")
             
     def load_language_preferences(self):
         language_file_path = self.get_language_file_path()
@@ -480,7 +1074,18 @@ class MainWindow(QWidget):
         self.edit_field.setStyleSheet(style)
         
 # Create and run the application
-app = QApplication(sys.argv)
-main_window = MainWindow()
-main_window.show()
-sys.exit(app.exec_())
+def main():
+    app = QApplication(sys.argv)
+    main_window = MainWindow()
+    main_window.show()
+    if "--exit-after-show" in sys.argv:
+        def report_and_quit():
+            print(json.dumps([name for name in HEAVY_MODULES if name in sys.modules]), flush=True)
+            app.quit()
+        # Runs once the event loop has processed the first paint
+        QTimer.singleShot(0, report_and_quit)
+    sys.exit(app.exec_())
+
+# The guard keeps spawned OCR worker processes from starting the GUI
+if __name__ == "__main__":
+    main()
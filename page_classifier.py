@@ -0,0 +1,121 @@
+# page_classifier.py
+# Cheap checks on each rasterized page before it goes to OCR.
+#
+# A page is reduced to a coarse ink-density grid (GRID_WIDTH cells across,
+# each cell the share of ink relative to the paper background). From it:
+#   blank      no cell away from the page edges holds more than a speck of ink
+#              (separator sheets; edges are ignored for scanner shadows)
+#   duplicate  the page's 256-bit average hash is close to that of an earlier
+#              page of the same document, no grid cell differs noticeably and
+#              the two pages match pixel for pixel (the same cover or form page
+#              included twice)
+# A duplicate reuses the text recognized for the earlier page. The grid only
+# finds candidates: a digit changed in a date or a letter in a name hardly
+# changes the ink of a cell. Every candidate is therefore confirmed on the
+# full page images, with the earlier page rendered again for it; a single
+# glyph-sized spot that differs keeps the pages apart. Reusing the wrong text
+# is worse than recognizing a page twice, so when in doubt (e.g. a page
+# scanned twice at a slight angle) a page counts as unique.
+
+import numpy as np
+import cv2
+
+BLANK = 'blank'
+DUPLICATE = 'duplicate'
+
+GRID_WIDTH = 64  # about 3 mm per cell on a letter page
+EDGE_CELLS = 3  # cells along each edge ignored for blank detection
+BLANK_MAX_CELL_INK = 0.03
+HASH_SIZE = 16  # 16 x 16 = 256 bit average hash
+HASH_MAX_DISTANCE = 16  # differing bits for a duplicate candidate
+DUPLICATE_MAX_CELL_DIFFERENCE = 0.1  # candidates only; same_pixels decides
+DETAIL_BLUR = 1.0  # sigma in pixels, evens out scanner noise
+DETAIL_MIN_DIFFERENCE = 64  # gray levels by which a pixel of a changed glyph differs
+DETAIL_WINDOW = 16  # pixels, about the size of a digit
+DETAIL_MAX_PIXELS = 2  # differing pixels allowed in any window
+
+
+# A page that is not sent to OCR: why, and for a duplicate the index of the
+# page whose text it reuses
+class SkippedPage:
+    def __init__(self, reason, original=None):
+        self.reason = reason
+        self.original = original
+
+
+# Share of ink per grid cell for a grayscale page, 0.0 (paper) to 1.0
+def ink_grid(gray):
+    height, width = gray.shape
+    grid_height = max(1, round(GRID_WIDTH * height / width))
+    # Area resizing by a whole factor is several times faster than to an
+    # arbitrary size, so shrink most of the way like that first
+    factor = width // (GRID_WIDTH * 4)
+    if factor > 1:
+        gray = cv2.resize(gray, (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+    cells = cv2.resize(gray, (GRID_WIDTH, grid_height), interpolation=cv2.INTER_AREA).astype(np.float32)
+    # Scanned paper is rarely pure white; measure ink against its actual shade
+    background = max(float(np.percentile(cells, 90)), 1.0)
+    return np.clip((background - cells) / background, 0.0, 1.0)
+
+def is_blank(grid):
+    interior = grid[EDGE_CELLS:-EDGE_CELLS, EDGE_CELLS:-EDGE_CELLS]
+    return interior.size == 0 or float(interior.max()) <= BLANK_MAX_CELL_INK
+
+# True when two grayscale pages show the same glyphs: `earlier` is aligned
+# to `gray` (the shift between two renderings or scans), both are blurred
+# slightly and no glyph-sized window holds more than a few pixels that differ
+# strongly in shade
+def same_pixels(earlier, gray):
+    if earlier.shape != gray.shape:
+        return False
+    earlier, gray = earlier.astype(np.float32), gray.astype(np.float32)
+    (shift_x, shift_y), _ = cv2.phaseCorrelate(255 - earlier, 255 - gray)
+    height, width = gray.shape
+    earlier = cv2.warpAffine(earlier, np.float32([[1, 0, shift_x], [0, 1, shift_y]]), (width, height),
+                             borderValue=255)
+    difference = cv2.absdiff(cv2.GaussianBlur(earlier, (0, 0), DETAIL_BLUR),
+                             cv2.GaussianBlur(gray, (0, 0), DETAIL_BLUR))
+    differing = (difference > DETAIL_MIN_DIFFERENCE).astype(np.float32)
+    counts = cv2.boxFilter(differing, -1, (DETAIL_WINDOW, DETAIL_WINDOW), normalize=False)
+    return float(counts.max()) <= DETAIL_MAX_PIXELS
+
+def average_hash(grid):
+    small = cv2.resize(grid, (HASH_SIZE, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    return (small > small.mean()).ravel()
+
+
+# Classifies the pages of one document; remembers the unique pages seen so far.
+# `render_page(page_index)` returns an earlier page as a grayscale array again,
+# as it was classified; without it no page is taken for a duplicate.
+class PageClassifier:
+    def __init__(self, detect_blank=True, detect_duplicates=True, render_page=None):
+        self.detect_blank = detect_blank
+        self.detect_duplicates = detect_duplicates and render_page is not None
+        self.render_page = render_page
+        self._page_indexes = []
+        self._hashes = np.empty((0, HASH_SIZE * HASH_SIZE), dtype=bool)
+        self._grids = []
+
+    # Returns a SkippedPage, or None when the page needs OCR
+    def classify(self, page_index, gray):
+        if not (self.detect_blank or self.detect_duplicates):
+            return None
+        grid = ink_grid(gray)
+        if self.detect_blank and is_blank(grid):
+            return SkippedPage(BLANK)
+        if not self.detect_duplicates:
+            return None
+
+        page_hash = average_hash(grid)
+        distances = np.count_nonzero(self._hashes != page_hash, axis=1)
+        for candidate in np.flatnonzero(distances <= HASH_MAX_DISTANCE):
+            earlier = self._grids[candidate]
+            if earlier.shape == grid.shape and float(np.abs(earlier - grid).max()) <= DUPLICATE_MAX_CELL_DIFFERENCE:
+                original = self._page_indexes[candidate]
+                if same_pixels(self.render_page(original), gray):
+                    return SkippedPage(DUPLICATE, original)
+
+        self._page_indexes.append(page_index)
+        self._hashes = np.vstack([self._hashes, page_hash])
+        self._grids.append(grid)
+        return None
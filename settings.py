@@ -0,0 +1,68 @@
+# settings.py
+# Application data directory and persisted processing settings.
+# Values are stored as JSON next to the API key and language preferences.
+
+import os
+import json
+import appdirs
+
+APP_NAME = "OCR-Tool"
+APP_AUTHOR = "MedMate"
+
+DEFAULT_SETTINGS = {
+    'ocr_workers': 0,  # 0 = one worker process per CPU core
+    'ocr_cache_max_mb': 256,  # 0 disables the OCR result cache
+    'ocr_backend': 'auto',  # auto, tesserocr (in-process) or pytesseract
+    'preprocessing': {},  # overrides for preprocessing.DEFAULT_CONFIG
+    'use_text_layer': True,  # take embedded PDF text as is; OCR only image-only pages
+    'dpi': 200,  # rasterization DPI, or 'auto' to pick it from the text size of each document
+    'crop_region': None,  # [left, top, right, bottom] page fractions to OCR, e.g. [0, 0.08, 1, 0.92]
+    'skip_blank_pages': True,  # no OCR for pages without ink
+    'reuse_duplicate_pages': True,  # pages identical to an earlier page reuse its text
+    'block_ocr': False,  # split large pages into text blocks recognized in parallel
+    'block_ocr_min_megapixels': 12,  # pages at least this large are split
+    'adaptive_ocr': False,  # re-read pages with low word confidence at a higher DPI
+    'adaptive_min_confidence': 70,  # mean word confidence (0-100) below which a page is re-read
+    'adaptive_retry_dpi': 300,
+    'adaptive_retry_preprocessing': {},  # overrides for ocr_engine.RETRY_PREPROCESSING
+    'strip_repeated_lines': True,  # translate headers/footers repeated on every page once per document
+    'translation_concurrency': 4,  # DeepL requests in flight at once
+    'deepl_server_url': '',  # empty = DeepL default; set for a proxy or local stub
+    'max_parallel_jobs': 2,  # documents processed at the same time in the GUI
+    'job_memory_limit_mb': 1024,  # estimated page image memory of all running documents
+    'export_format': 'docx',  # docx, txt or jsonl
+    'metrics_file': '',  # written after every document; .prom = Prometheus text format, else JSON
+}
+
+
+def get_app_dir():
+    app_dir = appdirs.user_data_dir(APP_NAME, APP_AUTHOR)
+    os.makedirs(app_dir, exist_ok=True)
+    return app_dir
+
+# set file path to store personal DeepL api key
+def get_api_key_file_path():
+    return os.path.join(get_app_dir(), "api_key.txt")
+
+def read_api_key():
+    try:
+        with open(get_api_key_file_path(), "r") as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def get_settings_file_path():
+    return os.path.join(get_app_dir(), "settings.json")
+
+def load_settings():
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(get_settings_file_path(), 'r') as file:
+            settings.update(json.load(file))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return settings
+
+def save_settings(settings):
+    with open(get_settings_file_path(), 'w') as file:
+        json.dump(settings, file, indent=2)
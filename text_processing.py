@@ -0,0 +1,90 @@
+# text_processing.py
+# Clean-up of OCR output before it is displayed, exported and translated.
+#
+# Every page is normalized on its own as soon as it is recognized:
+#   characters   Unicode NFC, typographic ligatures spelled out, control,
+#                zero-width and private-use characters (OCR noise) removed;
+#                letters of every script are kept
+#   hyphenation  a word hyphenated at the end of a line is joined again
+#   lines        the lines of a paragraph are joined into one, so a paragraph
+#                is a single compact segment for the translator; short lines
+#                (headings, addresses, table rows) are kept as they are
+#   whitespace   runs of spaces collapsed, lines without any letter or digit
+#                (rules, specks) dropped, paragraphs separated by one blank line
+
+import re
+import unicodedata
+from metrics import metrics
+
+# C0/C1 controls except tab and newline, soft hyphen, zero-width and
+# direction marks, byte order mark, replacement character, private use area
+INVISIBLE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f\u00ad\u200b-\u200f\u202a-\u202e'
+                       '\u2060-\u2064\ufeff\ufffd\ue000-\uf8ff]')
+LIGATURES = str.maketrans({'\ufb00': 'ff', '\ufb01': 'fi', '\ufb02': 'fl', '\ufb03': 'ffi', '\ufb04': 'ffl',
+                           '\ufb05': 'st', '\ufb06': 'st'})
+SPACES = re.compile(r'[^\S\n]+')
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+ALPHANUMERIC = re.compile(r'[^\W_]')
+HYPHENATED = re.compile(r'[^\W\d_]-$')
+# Lines starting like a list item or a new entry are never joined to the line above
+LIST_ITEM = re.compile(r'([-•–—*>]|\d+[.)]|[a-z][.)])\s')
+SENTENCE_END = ('.', '!', '?', ':', ';')
+
+# A line at least this share of the page's line width is wrapped text
+FULL_LINE_SHARE = 0.7
+FULL_LINE_MIN_LENGTH = 40  # shorter lines (names, addresses) are never full lines
+MEASURE_PERCENTILE = 0.9
+
+
+# Page text normalized for display, export and translation
+def normalize_page(text):
+    metrics.count('normalized_characters_in_total', len(text))
+    text = INVISIBLE.sub('', unicodedata.normalize('NFC', text).translate(LIGATURES))
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    paragraphs = []
+    for block in PARAGRAPH_BREAK.split(SPACES.sub(' ', text)):
+        lines = [line.strip() for line in block.split('\n')]
+        lines = [line for line in lines if ALPHANUMERIC.search(line)]
+        if lines:
+            paragraphs.append(lines)
+
+    measure = _line_measure([line for lines in paragraphs for line in lines])
+    text = '\n\n'.join('\n'.join(_join_lines(lines, measure)) for lines in paragraphs)
+    metrics.count('normalized_characters_out_total', len(text))
+    return text
+
+# Typical length of a full line on the page
+def _line_measure(lines):
+    if not lines:
+        return 0
+    lengths = sorted(len(line) for line in lines)
+    return lengths[round((len(lengths) - 1) * MEASURE_PERCENTILE)]
+
+# Joins the lines of a paragraph that continue the line above: after a
+# hyphenated word, before a line starting in lower case, or between two lines
+# of wrapped text (the line above fills the page width without ending a
+# sentence, the line below fills it too or ends the sentence). Each line is
+# judged by the source line above it, not by the text joined so far, and a
+# short standalone line (a name, an address, a subject) is never joined.
+def _join_lines(lines, measure):
+    full_length = max(FULL_LINE_MIN_LENGTH, measure * FULL_LINE_SHARE)
+    joined = [lines[0]]
+    for previous, line in zip(lines, lines[1:]):
+        continues = line[0].islower()
+        if HYPHENATED.search(previous) and (continues or line[0].isupper()):
+            # "traite-" + "ment" is one word; "Jean-" + "Pierre" keeps the hyphen
+            joined[-1] = (joined[-1][:-1] if continues else joined[-1]) + line
+        elif (not previous.endswith(SENTENCE_END) and not LIST_ITEM.match(line) and
+              (continues or (len(previous) >= full_length and (previous[-1].isalpha() or previous[-1] == ',') and
+                             (len(line) >= full_length or line.endswith(SENTENCE_END + (',',)))))):
+            joined[-1] += ' ' + line
+        else:
+            joined.append(line)
+    return joined
+
+# Puts the whitespace around `text` back around its replacement (e.g. its
+# translation), so the replacement keeps the indentation and line breaks
+def restore_whitespace(text, replacement):
+    stripped = text.strip()
+    start = text.index(stripped)
+    return text[:start] + replacement + text[start + len(stripped):]
@@ -0,0 +1,232 @@
+# translation.py
+# DeepL translation backed by a persistent translation memory.
+# Text is split into paragraph segments; segments translated before (for the
+# same target language) come from a local SQLite store. The misses are packed
+# into size-bounded batches that are sent to DeepL concurrently, retried on
+# rate limiting and server errors, and put back together in order.
+
+import os
+import re
+import time
+import random
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import deepl
+from boilerplate import has_letters
+from metrics import metrics
+from settings import get_app_dir
+from text_processing import restore_whitespace
+
+# Paragraphs are separated by blank lines; the separators are kept so the
+# translated text has the same layout as the source
+PARAGRAPH_SEPARATOR = re.compile(r'(\n\s*\n)')
+
+# SQLite limits the number of host parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+# DeepL accepts at most 50 texts and 128 KiB per request. Batches are kept
+# well below the size limit because the texts are form-encoded, which can
+# triple the size of non-ASCII characters.
+MAX_BATCH_TEXTS = 50
+MAX_BATCH_BYTES = 32 * 1024
+
+MAX_CONCURRENT_REQUESTS = 4
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0  # seconds, doubled on every retry
+
+# Retries are done by _translate_batch alone: the client's own retries (five by
+# default) would run inside every one of ours and multiply the requests sent
+deepl.http_client.max_network_retries = 0
+
+_translators = {}
+
+
+def get_translation_memory_path():
+    return os.path.join(get_app_dir(), "translation_memory.sqlite3")
+
+def split_paragraphs(text):
+    return PARAGRAPH_SEPARATOR.split(text)
+
+def segment_hash(segment):
+    return hashlib.sha256(segment.encode('utf-8')).hexdigest()
+
+# One client per API key and server, reused across documents and threads.
+# server_url points the client at another endpoint, e.g. a local stub server.
+def get_translator(api_key, server_url=None):
+    translator = _translators.get((api_key, server_url))
+    if translator is None:
+        translator = _translators[(api_key, server_url)] = deepl.Translator(api_key, server_url=server_url or None)
+    return translator
+
+# Packs segments, in order, into batches that respect the DeepL request limits.
+# A single paragraph larger than max_bytes is sent on its own.
+def make_batches(segments, max_texts=MAX_BATCH_TEXTS, max_bytes=MAX_BATCH_BYTES):
+    batches = []
+    batch, batch_bytes = [], 0
+    for segment in segments:
+        segment_bytes = len(segment.encode('utf-8'))
+        if batch and (len(batch) >= max_texts or batch_bytes + segment_bytes > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(segment)
+        batch_bytes += segment_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+# Rate limiting, server side failures and dropped connections are transient
+def is_retryable(error):
+    if isinstance(error, (deepl.TooManyRequestsException, deepl.ConnectionException)):
+        return True
+    status_code = getattr(error, 'http_status_code', None)
+    return status_code is not None and status_code >= 500
+
+
+class TranslationMemory:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or get_translation_memory_path()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " source_hash TEXT NOT NULL,"
+                " target_lang TEXT NOT NULL,"
+                " translation TEXT NOT NULL,"
+                " PRIMARY KEY (source_hash, target_lang))"
+            )
+
+    # A connection per call keeps the memory usable from any thread
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    # Returns {segment: translation} for the segments already in the memory
+    def lookup(self, segments, target_lang):
+        hashes = {segment_hash(segment): segment for segment in segments}
+        found = {}
+        hash_list = list(hashes)
+        with self._connect() as connection:
+            for start in range(0, len(hash_list), LOOKUP_BATCH_SIZE):
+                batch = hash_list[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = connection.execute(
+                    f"SELECT source_hash, translation FROM translations"
+                    f" WHERE target_lang = ? AND source_hash IN ({placeholders})",
+                    [target_lang, *batch],
+                )
+                for source_hash, translation in rows:
+                    found[hashes[source_hash]] = translation
+        return found
+
+    def store(self, translations, target_lang):
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO translations (source_hash, target_lang, translation)"
+                " VALUES (?, ?, ?)",
+                [(segment_hash(source), target_lang, translation) for source, translation in translations.items()],
+            )
+
+
+# A paragraph replaced by its translation; separators are kept as they are
+def _restore_part(part, translations):
+    segment = part.strip()
+    return restore_whitespace(part, translations[segment]) if segment else part
+
+class TranslationEngine:
+    def __init__(self, api_key, memory=None, server_url=None,
+                 max_concurrency=MAX_CONCURRENT_REQUESTS, max_retries=MAX_RETRIES,
+                 retry_delay=RETRY_BASE_DELAY):
+        self.api_key = api_key
+        self.memory = memory
+        self.server_url = server_url
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def _translate_batch(self, batch, target_lang):
+        metrics.count('deepl_characters_total', sum(len(text) for text in batch))
+        for attempt in range(self.max_retries + 1):
+            metrics.count('deepl_requests_total')
+            try:
+                with metrics.timer('deepl_request_seconds'):
+                    results = get_translator(self.api_key, self.server_url).translate_text(batch, target_lang=target_lang)
+                break
+            except deepl.DeepLException as error:
+                if attempt == self.max_retries or not is_retryable(error):
+                    metrics.count('deepl_errors_total')
+                    raise
+                metrics.count('deepl_retries_total')
+                # Exponential backoff with jitter so parallel batches do not retry in lockstep
+                time.sleep(self.retry_delay * 2 ** attempt * (1 + random.random()))
+
+        translations = dict(zip(batch, (result.text for result in results)))
+        # Stored per batch, so a failure later on does not lose finished work
+        if self.memory is not None:
+            self.memory.store(translations, target_lang)
+        return translations
+
+    # Returns {segment: translation} for all given segments
+    def translate_segments(self, segments, target_lang):
+        translations = self.memory.lookup(segments, target_lang) if self.memory is not None else {}
+        # dict.fromkeys keeps the order and drops repeated paragraphs
+        misses = list(dict.fromkeys(segment for segment in segments if segment not in translations))
+        metrics.count('translation_segments_total', len(segments))
+        metrics.count('translation_memory_hits_total', sum(segment in translations for segment in segments))
+        batches = make_batches(misses)
+        if len(batches) == 1 or self.max_concurrency == 1:
+            for batch in batches:
+                translations.update(self._translate_batch(batch, target_lang))
+        elif batches:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                for batch_translations in pool.map(self._translate_batch, batches, [target_lang] * len(batches)):
+                    translations.update(batch_translations)
+        return translations
+
+    # Translates several texts (e.g. pages) with shared requests, in order.
+    # With `repeated_lines` (a boilerplate.RepeatedLines kept for the whole
+    # document), the letterhead and footer lines repeated on every page are
+    # sent once instead of with every page and put back into each page.
+    def translate_pages(self, pages, target_lang, repeated_lines=None):
+        if repeated_lines is None:
+            splits = [([], page.split('\n'), []) for page in pages]
+        else:
+            for page in pages:
+                repeated_lines.observe(page)
+            splits = [repeated_lines.split(page) for page in pages]
+        page_parts = [split_paragraphs('\n'.join(body)) for _, body, _ in splits]
+        segments = [part.strip() for parts in page_parts for part in parts if part.strip()]
+        # Lines without letters (page numbers) stay as they are
+        edge_lines = [line for top, _, bottom in splits for line in top + bottom if has_letters(line)]
+        metrics.count('translation_repeated_lines_total', len(edge_lines))
+        with metrics.timer('translation_seconds'):
+            translations = self.translate_segments(
+                segments + [repeated_lines.source_line(line) for line in edge_lines], target_lang)
+            # Copies of a repeated line whose digits could not be carried over
+            # into the shared translation are translated by themselves
+            own_lines = [line.strip() for line in edge_lines
+                         if repeated_lines.translate_line(line, translations) is None]
+            if own_lines:
+                translations.update(self.translate_segments(own_lines, target_lang))
+        metrics.count('translated_pages_total', len(pages))
+
+        def translate_edge(line):
+            if not has_letters(line):
+                return line
+            return repeated_lines.translate_line(line, translations) or _restore_part(line, translations)
+
+        translated_pages = []
+        for (top, body, bottom), parts in zip(splits, page_parts):
+            lines = [translate_edge(line) for line in top]
+            if body:
+                lines.append(''.join(_restore_part(part, translations) for part in parts))
+            lines.extend(translate_edge(line) for line in bottom)
+            translated_pages.append('\n'.join(lines))
+        return translated_pages
+
+    def translate_text(self, text, target_lang):
+        return self.translate_pages([text], target_lang)[0]
+
+
+def translate_text(text, target_lang, api_key, memory=None, server_url=None,
+                   max_concurrency=MAX_CONCURRENT_REQUESTS):
+    engine = TranslationEngine(api_key, memory, server_url, max_concurrency)
+    return engine.translate_text(text, target_lang)